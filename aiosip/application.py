@@ -4,22 +4,30 @@ Same structure as aiohttp.web.Application
 import sys
 import asyncio
 import logging
+import functools
+import types
 import aiodns
 from contextlib import suppress
 import traceback
+from multidict import CIMultiDict
 
-__all__ = ['Application']
+__all__ = ['Application', 'RequestContext']
 
+from collections import OrderedDict
 from collections.abc import MutableMapping
 
-from . import __version__
-from .dialog import Dialog
-from .dialplan import BaseDialplan
+from . import __version__, utils
+from .dialog import Dialog, DialogRegistry
+from .dialplan import BaseDialplan, StatelessReply
 from .protocol import UDP, TCP, WS
 from .peers import UDPConnector, TCPConnector, WSConnector
-from .message import Response
+from .message import Response, encode_stateless_response
 from .contact import Contact
-from .via import Via
+from .executor import SerialExecutor, TaskRegistry, PriorityScheduler
+from .framer import MAX_HEADERS_SIZE, MAX_BODY_SIZE
+from .overload import OverloadController
+from .timers import TimingWheel, ExpiryIndex, T1, T2, T4
+from .transaction import ServerTransaction
 
 
 LOG = logging.getLogger(__name__)
@@ -27,10 +35,95 @@ LOG = logging.getLogger(__name__)
 DEFAULTS = {
     'user_agent': 'Python/{0[0]}.{0[1]}.{0[2]} aiosip/{1}'.format(sys.version_info, __version__),
     'override_contact_host': None,
-    'dialog_closing_delay': 30
+    'dialog_closing_delay': 30,
+    'max_headers_size': MAX_HEADERS_SIZE,
+    'max_body_size': MAX_BODY_SIZE,
+    'max_inflight': None,
+    'max_inflight_per_transport': None,
+    'overload_policy': 'drop',
+    'stateless_options': False,
+    'max_route_tasks': None,
+    'overload_max_lag': None,
+    'overload_max_transactions': None,
+    'overload_retry_after': 5,
+    'dispatch_limit': None,
+    'dispatch_weights': (4, 1),
+    't1': T1,
+    't2': T2,
+    't4': T4,
+    't1_min': None,
+    't1_max': T2,
 }
 
 
+MAX_COMPILED_ROUTES = 1024
+
+
+class RequestContext:
+    """
+    Request passed to routes along with the message starting them.
+    """
+    __slots__ = ('app', 'peer', 'msg', 'dialog', '_to_details')
+
+    def __init__(self, app, peer, msg):
+        self.app = app
+        self.peer = peer
+        self.msg = msg
+        self.dialog = None
+        self._to_details = None
+
+    def _create_dialog(self, dialog_factory=Dialog, **kwargs):
+        if not self.dialog:
+            msg = self.msg
+            self.dialog = self.peer._create_dialog(
+                method=msg.method,
+                from_details=Contact.from_header(msg.headers['To']),
+                to_details=Contact.from_header(msg.headers['From']),
+                call_id=msg.headers['Call-ID'],
+                inbound=True,
+                dialog_factory=dialog_factory,
+                **kwargs
+            )
+        return self.dialog
+
+    async def reply(self, status_code, status_message=None, payload=None, headers=None):
+        """
+        Answer the request within its transaction only, without creating a dialog.
+        """
+        msg = self.msg
+        headers = CIMultiDict(headers or {})
+        if 'User-Agent' not in headers:
+            headers['User-Agent'] = self.app.defaults['user_agent']
+        headers['Call-ID'] = msg.headers['Call-ID']
+        headers['Via'] = msg.via.values()
+
+        # Every response of the transaction carries the same To tag
+        if self._to_details is None:
+            self._to_details = Contact.from_header(msg.headers['To'])
+            self._to_details.add_tag()
+
+        self.peer.send_message(Response(
+            status_code=status_code,
+            status_message=status_message,
+            headers=headers,
+            from_details=msg.from_details,
+            to_details=self._to_details,
+            payload=payload,
+            cseq=msg.cseq,
+            method=msg.method
+        ))
+
+    async def prepare(self, status_code, *args, **kwargs):
+        dialog = self._create_dialog()
+
+        await dialog.reply(self.msg, status_code, *args, **kwargs)
+        if status_code >= 300:
+            await dialog.close()
+            return None
+
+        return dialog
+
+
 class Application(MutableMapping):
 
     def __init__(self, *,
@@ -54,15 +147,33 @@ class Application(MutableMapping):
         self.dns = dns_resolver
         self._finish_callbacks = []
         self._state = {}
-        self._dialogs = {}
+        self._dialogs = DialogRegistry()
         self._connectors = {UDP: UDPConnector(self, loop=loop),
                             TCP: TCPConnector(self, loop=loop),
                             WS: WSConnector(self, loop=loop)}
         self._middleware = middleware
-        self._tasks = list()
+        self._routes = OrderedDict()
+        self._tasks = TaskRegistry(limit=self.defaults['max_route_tasks'], loop=loop)
+        self._executor = SerialExecutor(loop=loop)
+        self._scheduler = PriorityScheduler(self.defaults['dispatch_weights'], self.defaults['dispatch_limit'])
+        self._held = {}
+        self._timers = TimingWheel(loop=loop)
+        self._expiries = ExpiryIndex(self._expire_dialogs, loop=loop)
+        self._transactions = {}
+        self._server_transactions = {}
+        self._inflight = 0
+        self._paused = set()
+        self.dropped = 0
 
         self.dialplan = dialplan
         self.loop = loop
+        self.overload = OverloadController(
+            self,
+            max_lag=self.defaults['overload_max_lag'],
+            max_transactions=self.defaults['overload_max_transactions'],
+            retry_after=self.defaults['overload_retry_after'],
+            loop=loop
+        )
 
     @property
     def peers(self):
@@ -71,7 +182,37 @@ class Application(MutableMapping):
 
     @property
     def dialogs(self):
-        yield from set(self._dialogs.values())
+        yield from self._dialogs
+
+    @property
+    def rtts(self):
+        """
+        Smoothed round-trip time and its variation measured for each peer.
+        """
+        return {peer.peer_addr: (peer.srtt, peer.rttvar) for peer in self.peers if peer.srtt is not None}
+
+    @property
+    def inflight(self):
+        """
+        Number of received messages being dispatched.
+        """
+        return self._inflight
+
+    @property
+    def tasks(self):
+        """
+        Number of route tasks running.
+        """
+        return len(self._tasks)
+
+    def limit_route(self, route, limit):
+        """
+        Cap the tasks running ``route`` to ``limit``, in place of ``max_route_tasks``.
+
+        Requests resolved to a route at its cap are answered with a 503. A
+        ``limit`` of None leaves the route uncapped.
+        """
+        self._tasks.limits[route] = limit
 
     async def connect(self, remote_addr, protocol=UDP, *, local_addr=None, **kwargs):
         connector = self._connectors[protocol]
@@ -89,64 +230,198 @@ class Application(MutableMapping):
 
         connector = self._connectors[protocol]
         server = await connector.create_server(local_addr, sock, **kwargs)
+        self.overload.start()
         return server
 
     async def _call_route(self, peer, route, msg):
-        for middleware_factory in reversed(self._middleware):
-            route = await middleware_factory(route)
+        if self._middleware:
+            route = await self._compile_route(route)
+        await route(RequestContext(self, peer, msg), msg)
+
+    async def _compile_route(self, route):
+        """
+        Route wrapped by the middleware factories, built once per route.
+        """
+        # Bound methods are created on each resolution, identify them by their instance and function
+        if isinstance(route, types.MethodType):
+            owners = route.__self__, route.__func__
+        else:
+            owners = route,
+        # The entry holds the owners so their ids can't be reused while it is cached
+        key = tuple(id(owner) for owner in owners)
+
+        entry = self._routes.get(key)
+        if entry is None:
+            # Concurrent first requests of a route wait for the same compilation
+            entry = self._routes[key] = owners, self.loop.create_future()
+            if len(self._routes) > MAX_COMPILED_ROUTES:
+                self._routes.popitem(last=False)
+
+            handler = route
+            try:
+                for middleware_factory in reversed(self._middleware):
+                    handler = await middleware_factory(handler)
+            except asyncio.CancelledError:
+                self._routes.pop(key, None)
+                entry[1].cancel()
+                raise
+            except Exception as e:
+                self._routes.pop(key, None)
+                entry[1].set_exception(e)
+                entry[1].exception()  # Retrieved by the waiting requests, if any
+                raise
+            entry[1].set_result(handler)
+            return handler
+
+        self._routes.move_to_end(key)
+        return await asyncio.shield(entry[1])
+
+    def _over_limit(self, protocol):
+        limit = self.defaults['max_inflight']
+        if limit is not None and self._inflight >= limit:
+            return True
+        limit = self.defaults['max_inflight_per_transport']
+        return limit is not None and protocol.inflight >= limit
+
+    def _retransmission(self, msg):
+        """
+        Absorb retransmissions of requests already handled by a server transaction.
+        """
+        if isinstance(msg, Response):
+            return False
+
+        if msg.method == 'ACK':
+            # ACKs of non 2xx final responses belong to the INVITE transaction
+            transaction = self._server_transactions.get((msg.via.branch, 'INVITE'))
+            return transaction is not None and transaction.response is not None \
+                and transaction.response.status_code >= 300
+
+        transaction = self._server_transactions.get((msg.via.branch, msg.method))
+        if transaction is None:
+            return False
+
+        transaction.retransmitted()
+        return True
+
+    def _response_sent(self, peer, msg):
+        transaction = self._server_transactions.get((msg.via.branch, msg.method))
+        if transaction is not None:
+            transaction.respond(peer, msg)
+
+    def _dispatch_later(self, protocol, msg, addr):
+        if self.defaults['stateless_options'] and not isinstance(msg, Response) and msg.method == 'OPTIONS' \
+                and 'tag' not in msg.to_details['params']:
+            # Keep alive pings, answered before any dispatch
+            self._reply_stateless(protocol, msg, addr, 200)
+            return
 
-        app = self
-        call_id = msg.headers['Call-ID']
+        # Everything that can fail on a malformed message is done before it is counted in flight
+        try:
+            call_id = msg.headers['Call-ID']
+            held = self._scheduler.limit is not None and (call_id in self._held or self._initial(msg))
+        except (KeyError, ValueError) as e:
+            LOG.warning('Dropping message that can not be dispatched: %r', e)
+            return
 
-        # TODO: refactor
-        class Request:
-            def __init__(self):
-                self.app = app
-                self.dialog = None
-
-            def _create_dialog(self, dialog_factory=Dialog, **kwargs):
-                if not self.dialog:
-                    self.dialog = peer._create_dialog(
-                        method=msg.method,
-                        from_details=Contact.from_header(msg.headers['To']),
-                        to_details=Contact.from_header(msg.headers['From']),
-                        call_id=call_id,
-                        inbound=True,
-                        dialog_factory=dialog_factory,
-                        **kwargs
-                    )
-                return self.dialog
-
-            async def prepare(self, status_code, *args, **kwargs):
-                dialog = self._create_dialog()
-
-                await dialog.reply(msg, status_code, *args, **kwargs)
-                if status_code >= 300:
-                    await dialog.close()
-                    return None
-
-                return dialog
-
-        request = Request()
-        await route(request, msg)
+        self._inflight += 1
+        protocol.inflight += 1
+        if held:
+            # Initial requests wait behind the traffic of existing dialogs, later
+            # messages of their Call-ID wait with them to keep their order
+            self._held[call_id] = self._held.get(call_id, 0) + 1
+            self._scheduler.submit(1, self._submit, protocol, msg, addr, True)
+        else:
+            self._scheduler.submit(0, self._submit, protocol, msg, addr, False)
 
-    async def _dispatch(self, protocol, msg, addr):
+        # Stream transports stop reading until the backlog is drained
+        if hasattr(protocol, 'pause_reading') and self._over_limit(protocol):
+            LOG.debug('Pausing %s, %s messages in flight', protocol, protocol.inflight)
+            protocol.pause_reading()
+            self._paused.add(protocol)
+
+    @staticmethod
+    def _initial(msg):
+        return not (isinstance(msg, Response) or msg.method in ('ACK', 'CANCEL') or 'tag' in msg.to_details['params'])
+
+    def _submit(self, protocol, msg, addr, held):
         call_id = msg.headers['Call-ID']
-        dialog = None
+        if held:
+            count = self._held.pop(call_id) - 1
+            if count:
+                self._held[call_id] = count
+
+        # Messages of a Call-ID are dispatched in order, other Call-IDs concurrently
+        future = self._executor.submit(call_id, self._dispatch(protocol, msg, addr))
+        future.add_done_callback(self._submitted_done)
+        future.add_done_callback(functools.partial(self._dispatch_done, protocol))
+
+    def _submitted_done(self, future):
+        self._scheduler.done()
+
+    def _dispatch_done(self, protocol, future):
+        if future.cancelled():
+            pass
+        elif future.exception() is not None:
+            LOG.error('Error while dispatching a message', exc_info=future.exception())
+
+        # Routes usually live as long as their dialog, they are bounded by max_route_tasks instead
+        self._inflight -= 1
+        protocol.inflight -= 1
+        for paused in [p for p in self._paused if not self._over_limit(p)]:
+            LOG.debug('Resuming %s, %s messages in flight', paused, paused.inflight)
+            self._paused.discard(paused)
+            paused.resume_reading()
+
+    def _reject(self, protocol, msg, addr):
+        protocol.dropped += 1
+        self.dropped += 1
+        if self.defaults['overload_policy'] != '503' or isinstance(msg, Response) or msg.method == 'ACK':
+            LOG.debug('Overloaded, dropping: %s', msg)
+            return
+
+        LOG.debug('Overloaded, rejecting: %s', msg)
+        self._reply_stateless(protocol, msg, addr, 503)
+
+    def _reply_stateless(self, protocol, msg, addr, status_code, status_message=None, headers=None):
+        headers = CIMultiDict(headers or {})
+        if 'User-Agent' not in headers:
+            headers['User-Agent'] = self.defaults['user_agent']
 
-        # First incoming request of dialogs do not yet have a tag in to headers
-        if 'tag' in msg.to_details['params']:
-            dialog = self._dialogs.get(frozenset((msg.to_details['params']['tag'],
-                                                  msg.from_details['params']['tag'],
-                                                  call_id)))
+        data = encode_stateless_response(msg, status_code, status_message, headers)
+        protocol.send_raw(data, msg.via.top.response_addr(source=addr))
 
-        # First response of dialogs have a tag in the to header but the dialog is not
-        # yet aware of it. Try to match only with the from header tag
-        if dialog is None:
-            dialog = self._dialogs.get(frozenset((None, msg.from_details['params']['tag'], call_id)))
+    def _server_transaction(self, protocol, msg):
+        """
+        Open the server transaction of a request, return False for retransmissions.
+        """
+        if protocol.reliable or msg.method == 'ACK':
+            return True
 
+        branch = msg.via.branch
+        # Branches of RFC 2543 peers can't identify a transaction
+        if not branch or not branch.startswith('z9hG4bK'):
+            return True
+
+        key = branch, msg.method
+        transaction = self._server_transactions.get(key)
+        if transaction is not None:
+            transaction.retransmitted()
+            return False
+
+        self._server_transactions[key] = ServerTransaction(self, key)
+        return True
+
+    async def _dispatch(self, protocol, msg, addr):
+        if isinstance(msg, Response):
+            transaction = self._transactions.get((msg.via.branch, msg.method))
+            if transaction is not None:
+                await transaction.dialog.receive_message(msg)
+                return
+
+        dialog = self._dialogs.match(msg)
         if dialog is not None:
-            await dialog.receive_message(msg)
+            if isinstance(msg, Response) or self._server_transaction(protocol, msg):
+                await dialog.receive_message(msg)
             return
 
         # If we got an ACK, but nowhere to deliver it, drop it. If we
@@ -156,19 +431,20 @@ class Application(MutableMapping):
             LOG.debug('Discarding incoming message: %s', msg)
             return
 
-        await self._run_dialplan(protocol, msg)
+        # New requests are turned away first, CANCELs still end pending calls
+        if msg.method != 'CANCEL' and self.overload.overloaded:
+            retry_after = self.overload.reject()
+            LOG.debug('Overloaded, rejecting %s for %ss', msg, retry_after)
+            self._reply_stateless(protocol, msg, addr, 503, headers={'Retry-After': str(retry_after)})
+            return
 
-    async def _run_dialplan(self, protocol, msg):
-        call_id = msg.headers['Call-ID']
-        via_header = msg.headers['Via']
+        return await self._run_dialplan(protocol, msg, addr)
 
-        # TODO: isn't multidict supposed to only return the first header?
-        if isinstance(via_header, list):
-            via_header = via_header[0]
+    async def _run_dialplan(self, protocol, msg, addr=None):
+        call_id = msg.headers['Call-ID']
 
         connector = self._connectors[type(protocol)]
-        via = Via.from_header(via_header)
-        via_addr = via['host'], int(via['port'])
+        via_addr = msg.via.top.response_addr(source=addr)
         peer = await connector.get_peer(protocol, via_addr)
 
         async def reply(*args, **kwargs):
@@ -192,24 +468,46 @@ class Application(MutableMapping):
                 remote_addr=peer.peer_addr
             )
 
-            if not route or not asyncio.iscoroutinefunction(route):
+            if isinstance(route, StatelessReply):
+                self._reply_stateless(protocol, msg, addr, route.status_code, route.status_message, route.headers)
+                return
+            elif route and self._tasks.full(route):
+                LOG.debug('Too many tasks running %s, rejecting %s', route, msg)
+                self._reply_stateless(protocol, msg, addr, 503)
+                return
+            elif not self._server_transaction(protocol, msg):
+                return
+            elif not route or not asyncio.iscoroutinefunction(route):
                 await reply(msg, status_code=501)
                 return
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            await self._reply_error(reply, msg, e)
+            return
 
-            t = asyncio.ensure_future(self._call_route(peer, route, msg))
-            self._tasks.append(t)
-            await t
+        # Routes outlive the dispatch of their first message, later messages of
+        # the Call-ID must not wait for them
+        return self._tasks.start(self._run_route(peer, route, msg, reply), key=route)
+
+    async def _run_route(self, peer, route, msg, reply):
+        try:
+            await self._call_route(peer, route, msg)
         except asyncio.CancelledError:
             pass
         except Exception as e:
-            LOG.exception(e)
-            payload = None
-            if self.debug:
-                with suppress(Exception):
-                    payload = traceback.format_exc()
-            await reply(msg, status_code=500, payload=payload)
+            await self._reply_error(reply, msg, e)
+
+    async def _reply_error(self, reply, msg, e):
+        LOG.exception(e)
+        payload = None
+        if self.debug:
+            with suppress(Exception):
+                payload = traceback.format_exc()
+        await reply(msg, status_code=500, payload=payload)
 
     def _connection_lost(self, protocol):
+        self._paused.discard(protocol)
         connector = self._connectors[type(protocol)]
         connector.connection_lost(protocol)
         # for task in self._tasks:
@@ -236,16 +534,35 @@ class Application(MutableMapping):
     def register_on_finish(self, func, *args, **kwargs):
         self._finish_callbacks.insert(0, (func, args, kwargs))
 
+    def _expire_dialogs(self, dialogs):
+        task = self.loop.create_task(self._close_dialogs(dialogs))
+        task.add_done_callback(utils._callback)
+
+    async def _close_dialogs(self, dialogs):
+        results = await asyncio.gather(*(dialog.close() for dialog in dialogs), return_exceptions=True)
+        for dialog, result in zip(dialogs, results):
+            if isinstance(result, Exception):
+                LOG.error('Failed to close %s: %r', dialog, result)
+
     async def close(self, timeout=5):
-        for dialog in set(self._dialogs.values()):
+        for dialog in self._dialogs:
             try:
                 await dialog.close(timeout=timeout)
             except asyncio.TimeoutError:
                 pass
         for connector in self._connectors.values():
             await connector.close()
-        for task in self._tasks:
-            task.cancel()
+        self._tasks.cancel()
+        # Queued messages will never be dispatched, they are no longer in flight
+        for callback, args in self._scheduler.clear():
+            self._inflight -= 1
+            args[0].inflight -= 1
+        self._held.clear()
+        # Their transports are closed, they must not dispatch what they still buffer
+        self._paused.clear()
+        self.overload.stop()
+        self._timers.close()
+        self._expiries.close()
 
     # def __repr__(self):
     #     return "<Application>"
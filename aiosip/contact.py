@@ -1,94 +1,118 @@
-import re
 import string
 import logging
-
-from collections.abc import MutableMapping
+import functools
 
 from .param import Param
 from .uri import Uri
-from .utils import gen_str
-
-
-CONTACT_PATTERNS = [
-    # unquoted name
-    re.compile('^(?P<name>[a-zA-Z0-9\-\.!%\*_\+`\'~]*)'
-               '[ \t]*'
-               '<(?P<uri>[^>]+)>'
-               '[ \t]*'
-               '(?:;(?P<params>[^\?]*))?'),
-    # quoted name
-    re.compile('^(?:"(?P<name>[^"]+)")'
-               '[ \t]*'
-               '<(?P<uri>[^>]+)>'
-               '[ \t]*'
-               '(?:;(?P<params>[^\?]*))?'),
-    # no name
-    re.compile('(?P<name>)'
-               '[ \t]*'
-               '(?P<uri>[^ ;]+)'
-               '[ \t]*'
-               '(?:;(?P<params>[^\?]*))?'),
-]
+from .utils import SlotsMapping, gen_str
 
 
 LOG = logging.getLogger(__name__)
 
+CONTACT_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=CONTACT_CACHE_SIZE)
+def parse_contact(contact):
+    """
+    Parse a name-addr or addr-spec header value in a single pass.
+
+    Return ``(name, uri, params)``. Results are cached, the returned ``Param``
+    must be copied before use.
+    """
+    contact = contact.strip(' \t')
+
+    if contact.startswith('"'):
+        end = 1
+        while True:
+            end = contact.find('"', end)
+            if end < 0:
+                raise ValueError('Not valid contact address')
+            elif contact[end - 1] != '\\':
+                break
+            end += 1
+        name = contact[1:end]
+        lt = contact.find('<', end)
+        if lt < 0 or contact[end + 1:lt].strip(' \t'):
+            raise ValueError('Not valid contact address')
+    else:
+        lt = contact.find('<')
+        name = contact[:lt].rstrip(' \t') if lt >= 0 else ''
+
+    if lt >= 0:
+        gt = contact.find('>', lt)
+        if gt < 0:
+            raise ValueError('Not valid contact address')
+        uri = contact[lt + 1:gt]
+        rest = contact[gt + 1:].lstrip(' \t')
+        if rest and rest[0] != ';':
+            raise ValueError('Not valid contact address')
+        params = rest[1:]
+    else:
+        uri, _, params = contact.partition(';')
+        uri = uri.rstrip(' \t')
+
+    if not uri:
+        raise ValueError('Not valid contact address')
+
+    return name, uri, Param(params.partition('?')[0])
+
+
+class Contact(SlotsMapping):
+    __slots__ = ('name', 'uri', 'params')
+    _fields = __slots__
 
-class Contact(MutableMapping):
     def __init__(self, *args, **kwargs):
-        self._contact = dict(*args, **kwargs)
+        contact = dict(*args, **kwargs)
+        self.name = contact.pop('name', None)
 
-        params = self._contact.get('params')
-        if not params:
-            self._contact['params'] = Param()
-        if not isinstance(params, Param):
-            self._contact['params'] = Param(self._contact['params'])
+        uri = contact.pop('uri')
+        self.uri = uri if isinstance(uri, Uri) else Uri(uri)
 
-        uri = self._contact.get('uri')
-        if not isinstance(uri, Uri):
-            self._contact['uri'] = Uri(self._contact['uri'])
+        params = contact.pop('params', None)
+        self.params = params if isinstance(params, Param) else Param(params or '')
+
+        self._extra = contact or None
 
     def add_tag(self):
-        if 'tag' not in self._contact['params']:
-            self._contact['params']['tag'] = gen_str(16, string.digits + 'abcdef')
+        if 'tag' not in self.params:
+            self.params['tag'] = gen_str(16, string.digits + 'abcdef')
+
+    def _state(self):
+        return self.name, self.params, self.params._version, self.uri, self.uri._state()
 
     @classmethod
     def from_header(cls, contact):
-        for s in CONTACT_PATTERNS:
-            m = s.match(contact)
-            if m:
-                return cls(m.groupdict())
-        else:
-            raise ValueError('Not valid contact address')
+        name, uri, params = parse_contact(contact)
+        return cls(name=name, uri=Uri(uri), params=params.copy())
 
     def __str__(self):
         r = ''
-        if self._contact.get('name'):  # Check if name exist and is not empty
-            r += '"%s" ' % self._contact['name']
-        r += self._contact['uri'].contact_repr()
-        params = self._contact['params']
-        if params:
-            r += ';%s' % str(params)
+        if self.name:  # Check if name exist and is not empty
+            r += '"%s" ' % self.name
+        r += self.uri.contact_repr()
+        if self.params:
+            r += ';%s' % str(self.params)
         return r
 
     @property
     def scheme(self):
-        return self._contact['uri']['scheme']
+        return self.uri.scheme
 
     @property
     def transport(self):
-        transport = self._contact['params'].get('transport')
+        transport = self.params.get('transport')
         if not transport:
             return 'tcp' if self.scheme == 'sips' else 'udp'
         return transport
 
     @property
     def host(self):
-        return self._contact['uri']['host']
+        return self.uri.host
 
     @property
     def port(self):
-        port = self._contact['uri'].get('port')
+        port = self.uri.port
         if not port:
             if self.scheme == 'sips':
                 return 5061
@@ -101,22 +125,3 @@ class Contact(MutableMapping):
     @property
     def details(self):
         return self.scheme, self.transport, self.host, self.port
-
-    # MutableMapping API
-    def __eq__(self, other):
-        return self is other
-
-    def __getitem__(self, key):
-        return self._contact[key]
-
-    def __setitem__(self, key, value):
-        self._contact[key] = value
-
-    def __delitem__(self, key):
-        del self._contact[key]
-
-    def __len__(self):
-        return len(self._contact)
-
-    def __iter__(self):
-        return iter(self._contact)
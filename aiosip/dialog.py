@@ -3,7 +3,6 @@ import asyncio
 import logging
 
 from multidict import CIMultiDict
-from collections import defaultdict
 from async_timeout import timeout as Timeout
 
 from . import utils
@@ -22,6 +21,108 @@ class CallState(enum.Enum):
     Terminated = enum.auto()
 
 
+class DialogRegistry:
+    """
+    Dialogs of an application, indexed by Call-ID then by (local tag, remote tag).
+
+    A dialog is registered under its tags, and under ``(None, remote tag)``
+    while the remote side may still send requests without our tag. Every key
+    belongs to the dialog it was added for and ``remove`` drops them all.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._dialogs = set()
+
+    def add(self, dialog, alias=True):
+        local, remote = dialog.from_details['params'].get('tag'), dialog.to_details['params'].get('tag')
+        calls = self._calls.setdefault(dialog.call_id, {})
+        calls[(local, remote)] = dialog
+        if alias and remote is not None:
+            calls[(None, remote)] = dialog
+        self._dialogs.add(dialog)
+
+    def remove(self, dialog):
+        calls = self._calls.get(dialog.call_id)
+        if calls is not None:
+            for key in [key for key, value in calls.items() if value is dialog]:
+                del calls[key]
+            if not calls:
+                del self._calls[dialog.call_id]
+        self._dialogs.discard(dialog)
+
+    def discard_alias(self, dialog):
+        calls = self._calls.get(dialog.call_id)
+        key = None, dialog.to_details['params'].get('tag')
+        if calls is not None and calls.get(key) is dialog:
+            del calls[key]
+
+    def match(self, msg):
+        """
+        Dialog of a received message, if any.
+        """
+        calls = self._calls.get(msg.headers['Call-ID'])
+        if calls is None:
+            return None
+
+        to_tag = msg.to_details['params'].get('tag')
+        from_tag = msg.from_details['params'].get('tag')
+        if isinstance(msg, Response):
+            key, early = (from_tag, to_tag), (from_tag, None)
+        else:
+            key, early = (to_tag, from_tag), (None, from_tag)
+
+        dialog = calls.get(key) if to_tag is not None else None
+        if dialog is None:
+            # First response of dialogs have a tag in the to header but the dialog is not
+            # yet aware of it, first requests do not yet have a tag in the to header
+            dialog = calls.get(early)
+        return dialog
+
+    @property
+    def calls(self):
+        """
+        Number of Call-IDs with a dialog.
+        """
+        return len(self._calls)
+
+    def clear(self):
+        self._calls.clear()
+        self._dialogs.clear()
+
+    def __iter__(self):
+        return iter(list(self._dialogs))
+
+    def __len__(self):
+        return len(self._dialogs)
+
+
+class OutOfDialog:
+    """
+    Owner of a transaction sent outside of any dialog, see ``Peer.send_request``.
+
+    Provides what transactions need from a dialog without being registered in
+    the application dialogs or waiting to be closed.
+    """
+    def __init__(self, app, peer, password=None):
+        self.app = app
+        self.peer = peer
+        self.password = password
+        self.transactions = set()
+
+    async def receive_message(self, msg):
+        transaction = self.app._transactions.get((msg.via.branch, msg.method))
+        if transaction is not None and transaction.dialog is self:
+            transaction._incoming(msg)
+
+    def end_transaction(self, transaction):
+        if transaction in self.transactions:
+            self.transactions.discard(transaction)
+            transaction.close()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} peer={self.peer}>'
+
+
 class DialogBase:
     def __init__(self,
                  app,
@@ -47,37 +148,35 @@ class DialogBase:
         self.password = password
         self.cseq = cseq
         self.inbound = inbound
-        self.transactions = defaultdict(dict)
+        self.transactions = set()
         self.auth = None
 
         # TODO: Needs to be last because we need the above attributes set
         self.original_msg = self._prepare_request(method, headers=headers, payload=payload)
 
         self._closed = False
-        self._closing = None
 
     @property
     def dialog_id(self):
-        return frozenset((self.original_msg.to_details['params'].get('tag'),
-                          self.original_msg.from_details['params']['tag'],
-                          self.call_id))
-
-    def _receive_response(self, msg):
+        return self.call_id, self.from_details['params'].get('tag'), self.to_details['params'].get('tag')
 
+    def _learn_remote_tag(self, msg):
         if 'tag' not in self.to_details['params']:
-            del self.app._dialogs[self.dialog_id]
+            self.app._dialogs.remove(self)
             self.to_details['params']['tag'] = msg.to_details['params']['tag']
-            self.app._dialogs[self.dialog_id] = self
+            self.app._dialogs.add(self, alias=False)
+
+    def _receive_response(self, msg):
+        self._learn_remote_tag(msg)
 
-        try:
-            transaction = self.transactions[msg.method][msg.cseq]
+        transaction = self.app._transactions.get((msg.via.branch, msg.method))
+        if transaction is not None and transaction.dialog is self:
             transaction._incoming(msg)
-        except KeyError:
-            if msg.method != 'ACK':
-                # TODO: Hack to suppress warning on ACK messages,
-                # since we don't quite handle them correctly. They're
-                # ignored, for now...
-                LOG.debug('Response without Request. The Transaction may already be closed. \n%s', msg)
+        elif msg.method != 'ACK':
+            # TODO: Hack to suppress warning on ACK messages,
+            # since we don't quite handle them correctly. They're
+            # ignored, for now...
+            LOG.debug('Response without Request. The Transaction may already be closed. \n%s', msg)
 
     def _prepare_request(self, method, contact_details=None, headers=None, payload=None, cseq=None, to_details=None):
 
@@ -151,15 +250,7 @@ class DialogBase:
     def close_later(self, delay=None):
         if delay is None:
             delay = self.app.defaults['dialog_closing_delay']
-        if self._closing:
-            self._closing.cancel()
-
-        async def closure():
-            await asyncio.sleep(delay)
-            await self.close()
-
-        self._closing = asyncio.ensure_future(closure())
-        self._closing.add_done_callback(utils._callback)
+        self.app._expiries.schedule(self, delay)
 
     def _maybe_close(self, msg):
         if msg.method in ('REGISTER', 'SUBSCRIBE') and not self.inbound:
@@ -173,39 +264,27 @@ class DialogBase:
 
     def _close(self):
         LOG.debug('Closing: %s', self)
-        if self._closing:
-            self._closing.cancel()
+        self.app._expiries.cancel(self)
 
-        for transactions in self.transactions.values():
-            for transaction in transactions.values():
-                transaction.close()
+        for transaction in list(self.transactions):
+            transaction.close()
 
-        # Should not be necessary once dialog are correctly tracked
-        try:
-            del self.app._dialogs[self.dialog_id]
-        except KeyError as e:
-            pass
+        self.app._dialogs.remove(self)
 
     def _connection_lost(self):
-        for transactions in self.transactions.values():
-            for transaction in transactions.values():
-                transaction._error(ConnectionError)
+        for transaction in list(self.transactions):
+            transaction._error(ConnectionError)
 
     async def start_unreliable_transaction(self, msg, method=None):
+        # ``method`` used to index the transactions of the dialog, it is kept for compatibility
         transaction = UnreliableTransaction(self, original_msg=msg, loop=self.app.loop)
-        self.transactions[method or msg.method][msg.cseq] = transaction
+        self.transactions.add(transaction)
         return await transaction.start()
 
     def end_transaction(self, transaction):
-        to_delete = list()
-        for method, values in self.transactions.items():
-            for cseq, t in values.items():
-                if transaction is t:
-                    transaction.close()
-                    to_delete.append((method, cseq))
-
-        for item in to_delete:
-            del self.transactions[item[0]][item[1]]
+        if transaction in self.transactions:
+            self.transactions.discard(transaction)
+            transaction.close()
 
     async def request(self, method, contact_details=None, headers=None, payload=None, timeout=None):
         msg = self._prepare_request(method, contact_details, headers, payload)
@@ -231,7 +310,7 @@ class DialogBase:
             headers['User-Agent'] = self.app.defaults['user_agent']
 
         headers['Call-ID'] = self.call_id
-        headers['Via'] = request.headers['Via']
+        headers['Via'] = request.via.values()
 
         msg = Response(
             status_code=status_code,
@@ -270,8 +349,7 @@ class Dialog(DialogBase):
         self._incoming = asyncio.Queue()
 
     async def receive_message(self, msg):
-        if self._closing:
-            self._closing.cancel()
+        self.app._expiries.cancel(self)
 
         if self.cseq < msg.cseq:
             self.cseq = msg.cseq
@@ -284,14 +362,8 @@ class Dialog(DialogBase):
     async def _receive_request(self, msg):
 
         if 'tag' in msg.to_details['params']:
-            try:
-                del self.app._dialogs[
-                    frozenset((self.original_msg.to_details['params'].get('tag'),
-                               None,
-                               self.call_id))
-                ]
-            except KeyError:
-                pass
+            # The peer knows our tag, requests without it can't belong to this dialog anymore
+            self.app._dialogs.discard_alias(self)
 
         await self._incoming.put(msg)
         self._maybe_close(msg)
@@ -355,11 +427,7 @@ class InviteDialog(DialogBase):
         self._waiter = asyncio.Future()
 
     async def receive_message(self, msg):  # noqa: C901
-
-        if 'tag' not in self.to_details['params']:
-            del self.app._dialogs[self.dialog_id]
-            self.to_details['params']['tag'] = msg.to_details['params']['tag']
-            self.app._dialogs[self.dialog_id] = self
+        self._learn_remote_tag(msg)
 
         async def set_result(msg):
             self.ack(msg)
@@ -443,15 +511,9 @@ class InviteDialog(DialogBase):
             raise RuntimeError("INVITE failed with {}".format(msg.status_code))
 
     def end_transaction(self, transaction):
-        to_delete = list()
-        for method, values in self.transactions.items():
-            for cseq, t in values.items():
-                if transaction is t:
-                    transaction.close()
-                    to_delete.append((method, cseq))
-
-        for item in to_delete:
-            del self.transactions[item[0]][item[1]]
+        if transaction in self.transactions:
+            self.transactions.discard(transaction)
+            transaction.close()
 
     async def close(self, timeout=None):
         if not self._closed:
@@ -465,7 +527,7 @@ class InviteDialog(DialogBase):
 
             if msg:
                 transaction = UnreliableTransaction(self, original_msg=msg, loop=self.app.loop)
-                self.transactions[msg.method][msg.cseq] = transaction
+                self.transactions.add(transaction)
 
                 try:
                     async with Timeout(timeout):
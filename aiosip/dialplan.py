@@ -1,9 +1,137 @@
 import logging
+import itertools
+
+from .uri import parse_uri
 
 LOG = logging.getLogger(__name__)
 
 
+class StatelessReply:
+    """
+    Route answering requests outside of dialogs without keeping any state.
+
+    Resolving a request to a ``StatelessReply`` sends the response straight
+    from the request headers, no dialog, transaction or timer is created.
+    """
+    def __init__(self, status_code=200, status_message=None, headers=None):
+        self.status_code = status_code
+        self.status_message = status_message
+        self.headers = headers
+
+
 class BaseDialplan:
     async def resolve(self, method, message, protocol, local_addr, remote_addr):
         LOG.debug('Resolving dialplan for %s %s connecting on %s from %s via %s',
                   method, message, local_addr, remote_addr, protocol)
+
+
+class _UserTrie:
+    """
+    Routes of a table entry by Request-URI user, exact users first then the longest prefix.
+    """
+    def __init__(self):
+        self.exact = {}
+        self.root = {}
+
+    def add(self, user, route):
+        if user is not None and not user.endswith('*'):
+            table, key = self.exact, user
+        else:
+            node = self.root
+            for c in (user or '*')[:-1]:
+                node = node.setdefault(c, {})
+            table, key = node, None
+
+        if key in table:
+            raise ValueError('Duplicate route for user {!r}'.format(user))
+        table[key] = route
+
+    def get(self, user):
+        if user is None:
+            return self.root.get(None)
+
+        route = self.exact.get(user)
+        if route is not None:
+            return route
+
+        node = self.root
+        route = node.get(None)
+        for c in user:
+            node = node.get(c)
+            if node is None:
+                break
+            route = node.get(None, route)
+        return route
+
+
+class RoutingDialplan(BaseDialplan):
+    """
+    Dialplan resolving requests from a table of routes.
+
+    Routes are added with ``add_route`` and matched on the method, the
+    transport class, the local address, and the user and host of the
+    Request-URI. Users ending with ``*`` match a prefix. Criteria left to
+    None match anything.
+
+    The routes are compiled on first use into dicts keyed on the given
+    criteria, each holding a trie of users. When several routes match, the
+    most specific one wins, in the order of the criteria above. Resolutions
+    are memoized until ``cache_size`` distinct keys have been seen.
+    """
+    def __init__(self, default=None, cache_size=4096):
+        self.default = default
+        self.cache_size = cache_size
+        self._routes = []
+        self._table = None
+        self._masks = None
+        self._cache = {}
+
+    def add_route(self, route, *, method=None, user=None, host=None, local_addr=None, protocol=None):
+        """
+        Resolve matching requests to ``route``, a coroutine function or a ``StatelessReply``.
+        """
+        method = method.upper() if method else None
+        self._routes.append(((method, protocol, local_addr, host), user, route))
+        self._table = None
+        self._cache.clear()
+
+    def _compile(self):
+        table = {}
+        masks = set()
+        for key, user, route in self._routes:
+            table.setdefault(key, _UserTrie()).add(user, route)
+            masks.add(tuple(criterion is not None for criterion in key))
+
+        # The most specific combination of criteria comes first
+        self._masks = [mask for mask in itertools.product((True, False), repeat=4) if mask in masks]
+        self._table = table
+
+    async def resolve(self, method, message, protocol, local_addr, remote_addr):
+        _, user, _, host, _, _, _ = parse_uri(message._first_line.split(' ', 2)[1])
+        # Applications pass the transport class, ``Peer.protocol``
+        protocol = protocol if isinstance(protocol, type) else type(protocol)
+        key = method, protocol, tuple(local_addr) if local_addr else None, host, user
+
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        route = self._lookup(*key)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = route
+        return route
+
+    def _lookup(self, method, protocol, local_addr, host, user):
+        if self._table is None:
+            self._compile()
+
+        criteria = method, protocol, local_addr, host
+        for mask in self._masks:
+            trie = self._table.get(tuple(c if m else None for c, m in zip(criteria, mask)))
+            if trie is not None:
+                route = trie.get(user)
+                if route is not None:
+                    return route
+        return self.default
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import functools
+
+from collections import deque
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _copy_result(future, task):
+    if future.cancelled():
+        return
+    elif task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+class SerialExecutor:
+    """
+    Run coroutines submitted under the same key one after the other.
+
+    Coroutines of different keys run concurrently. A key only holds a queue
+    while it has pending work, and work submitted to an idle key is started
+    right away as a plain task.
+    """
+    def __init__(self, *, loop=None):
+        self.loop = loop
+        self._queues = {}
+
+    def submit(self, key, coro):
+        """
+        Schedule ``coro`` after the work already pending for ``key``.
+
+        Return a future resolved with the result of ``coro``.
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        if key not in self._queues:
+            # Most keys never have more than one coroutine at a time, only allocate a queue when needed
+            self._queues[key] = None
+            return self._start(key, coro)
+
+        queue = self._queues[key]
+        if queue is None:
+            queue = self._queues[key] = deque()
+
+        future = self.loop.create_future()
+        queue.append((coro, future))
+        return future
+
+    def pending(self, key):
+        """
+        Number of coroutines queued or running for ``key``.
+        """
+        if key not in self._queues:
+            return 0
+        return len(self._queues[key] or ()) + 1
+
+    def _start(self, key, coro):
+        return self.loop.create_task(self._run(key, coro))
+
+    async def _run(self, key, coro):
+        try:
+            return await coro
+        finally:
+            self._next(key)
+
+    def _next(self, key):
+        queue = self._queues[key]
+        while queue:
+            coro, future = queue.popleft()
+            if future.cancelled():
+                coro.close()
+                continue
+            task = self._start(key, coro)
+            task.add_done_callback(functools.partial(_copy_result, future))
+            return
+        del self._queues[key]
+
+    def __len__(self):
+        return len(self._queues)
+
+
+class TaskRegistry:
+    """
+    Tasks started by an application, forgotten as soon as they are done.
+
+    Tasks are counted under a key, such as the route they run. A key can be
+    capped by ``limit`` or by its entry in ``limits``, ``start`` then refuses
+    to start more tasks for it until some are done.
+    """
+    def __init__(self, limit=None, *, loop=None):
+        self.limit = limit
+        self.limits = {}
+        self.loop = loop
+        self._tasks = set()
+        self._active = {}
+
+    def full(self, key):
+        limit = self.limits.get(key, self.limit)
+        return limit is not None and self._active.get(key, 0) >= limit
+
+    def start(self, coro, key=None):
+        """
+        Run ``coro`` in a task counted under ``key``.
+
+        Return the task, or None when ``key`` is at its limit and ``coro`` is closed.
+        """
+        if self.full(key):
+            coro.close()
+            return None
+
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        self._active[key] = self._active.get(key, 0) + 1
+        task.add_done_callback(functools.partial(self._done, key))
+        return task
+
+    def _done(self, key, task):
+        self._tasks.discard(task)
+        active = self._active[key] - 1
+        if active:
+            self._active[key] = active
+        else:
+            del self._active[key]
+
+    def active(self, key=None):
+        """
+        Number of tasks running for ``key``.
+        """
+        return self._active.get(key, 0)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def __iter__(self):
+        return iter(list(self._tasks))
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+class PriorityScheduler:
+    """
+    Start queued callbacks by priority while fewer than ``limit`` are active.
+
+    Priority 0 is the highest. Queues are served in weighted round robin: up to
+    ``weights[0]`` callbacks of priority 0, then ``weights[1]`` of priority 1 and
+    so on, so lower priorities are slowed down but never starved. Callers report
+    the end of the work a callback started with ``done``. Without a limit,
+    callbacks are called right away.
+    """
+    def __init__(self, weights=(4, 1), limit=None):
+        self.weights = weights
+        self.limit = limit
+        self.active = 0
+        self._queues = [deque() for _ in weights]
+        self._credits = list(weights)
+
+    def submit(self, priority, callback, *args):
+        if self.limit is None or (self.active < self.limit and not any(self._queues)):
+            self._start(callback, args)
+        else:
+            self._queues[priority].append((callback, args))
+
+    def done(self):
+        self.active -= 1
+        while self.limit is None or self.active < self.limit:
+            item = self._next()
+            if item is None:
+                return
+            self._start(*item)
+
+    def _start(self, callback, args):
+        self.active += 1
+        try:
+            callback(*args)
+        except Exception as e:
+            self.active -= 1
+            LOG.exception(e)
+
+    def _next(self):
+        for _ in range(2):
+            for priority, queue in enumerate(self._queues):
+                if queue and self._credits[priority]:
+                    self._credits[priority] -= 1
+                    return queue.popleft()
+            # Every non empty queue used its share of the round
+            self._credits = list(self.weights)
+        return None
+
+    def pending(self, priority=None):
+        if priority is None:
+            return sum(len(queue) for queue in self._queues)
+        return len(self._queues[priority])
+
+    def clear(self):
+        """
+        Drop the queued callbacks, return them as ``(callback, args)`` pairs.
+        """
+        dropped = []
+        for queue in self._queues:
+            dropped.extend(queue)
+            queue.clear()
+        return dropped
+
+    def __len__(self):
+        return self.pending()
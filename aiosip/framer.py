@@ -0,0 +1,98 @@
+import logging
+
+from . import parser
+from .message import Message
+
+
+LOG = logging.getLogger(__name__)
+
+MAX_HEADERS_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class StreamFramer:
+    """
+    Split the byte stream of a connection in SIP messages.
+
+    Received data is appended to a single ``bytearray``. The search for the end of
+    headers resumes where the previous one stopped, and consumed messages are
+    dropped from the front of the buffer, so a burst of pipelined messages is
+    framed in linear time. A ``ValueError`` is raised when a peer exceeds the
+    headers or body size limits, or sends something that isn't SIP.
+    """
+    def __init__(self, max_headers_size=MAX_HEADERS_SIZE, max_body_size=MAX_BODY_SIZE):
+        self.max_headers_size = max_headers_size
+        self.max_body_size = max_body_size
+        self._buffer = bytearray()
+        self._scan = 0
+        self._msg = None
+        self._body_start = 0
+        self._body_end = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        """
+        Append ``data`` to the buffer and return an iterator over the completed messages.
+        """
+        self._buffer += data
+        return self._frames()
+
+    def _frames(self):
+        buffer = self._buffer
+        while True:
+            if self._msg is None:
+                if not self._skip_keepalives():
+                    return
+
+                end = buffer.find(parser.HEADERS_END, self._scan)
+                if end < 0:
+                    if len(buffer) > self.max_headers_size:
+                        raise ValueError('Headers larger than {} bytes'.format(self.max_headers_size))
+                    # The end of headers may straddle two chunks
+                    self._scan = max(0, len(buffer) - len(parser.HEADERS_END) + 1)
+                    return
+                elif end > self.max_headers_size:
+                    raise ValueError('Headers larger than {} bytes'.format(self.max_headers_size))
+
+                msg, content_length = self._parse_headers(end)
+                self._msg = msg
+                self._body_start = end + len(parser.HEADERS_END)
+                self._body_end = self._body_start + content_length
+
+            if len(buffer) < self._body_end:
+                return
+
+            msg, self._msg = self._msg, None
+            with memoryview(buffer) as view:
+                msg._raw_payload = view[self._body_start:self._body_end].tobytes()
+            del buffer[:self._body_end]
+            self._scan = 0
+            yield msg
+
+    def _parse_headers(self, end):
+        try:
+            with memoryview(self._buffer) as view:
+                msg = Message.from_raw_headers(view[:end].tobytes())
+            content_length = int(msg.headers.get('Content-Length', 0))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            # The buffer can't move past a message that can't be parsed
+            raise ValueError('Not valid SIP message: {!r}'.format(e)) from e
+
+        if content_length < 0:
+            raise ValueError('Negative Content-Length')
+        elif content_length > self.max_body_size:
+            raise ValueError('Body larger than {} bytes'.format(self.max_body_size))
+        return msg, content_length
+
+    def _skip_keepalives(self):
+        # RFC 5626 keep alives are CRLFs sent between messages
+        buffer = self._buffer
+        start = 0
+        while buffer[start:start + 2] == parser.BYTES_EOL:
+            start += 2
+        if start:
+            del buffer[:start]
+            self._scan = 0
+        return bool(buffer)
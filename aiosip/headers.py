@@ -0,0 +1,122 @@
+import functools
+
+from collections.abc import MutableMapping
+
+from multidict import getversion
+
+
+_MISSING = object()
+
+# RFC 3261 section 7.3.1 recommends that headers needed for proxy processing appear first
+CANONICAL_ORDER = ('Via', 'Route', 'Max-Forwards', 'From', 'To', 'Call-ID', 'CSeq', 'Contact')
+_RANKS = {name.lower(): rank for rank, name in enumerate(CANONICAL_ORDER)}
+
+
+@functools.lru_cache(maxsize=512)
+def emission_order(names):
+    """
+    Return the indexes of ``names`` in the order the headers are written on the wire.
+
+    Headers of ``CANONICAL_ORDER`` come first, the others follow in alphabetical order.
+    """
+    last = len(_RANKS)
+    return tuple(sorted(range(len(names)), key=lambda i: (_RANKS.get(names[i].lower(), last), names[i])))
+
+
+def version(headers):
+    """
+    Return a counter changed by every modification of ``headers``, or None if the
+    mapping does not track its modifications.
+    """
+    if isinstance(headers, RawHeaders):
+        return headers._version
+    try:
+        return getversion(headers)
+    except TypeError:
+        return None
+
+
+class RawHeaders(MutableMapping):
+    """
+    Case insensitive headers of a received message.
+
+    Only the offsets of each header are recorded at parse time, values are decoded
+    from the raw header block when first accessed. Repeated headers are returned as
+    a list, like the headers built by the rest of aiosip.
+    """
+    def __init__(self, data, fields):
+        self._version = 0
+        self._data = data
+        self._headers = {}
+
+        for name, start, end in fields:
+            key = name.lower()
+            header = self._headers.get(key)
+            if header is None:
+                self._headers[key] = [name, [(start, end)], _MISSING]
+            else:
+                header[1].append((start, end))
+
+    def _decode(self, header):
+        data = self._data
+        spans = header[1]
+        if len(spans) == 1:
+            start, end = spans[0]
+            value = data[start:end].decode()
+        else:
+            value = [data[start:end].decode() for start, end in spans]
+        header[2] = value
+        return value
+
+    def getall(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        return list(value) if isinstance(value, list) else [value]
+
+    def add(self, key, value):
+        if key in self:
+            o = self[key]
+            if not isinstance(o, list):
+                o = [o]
+            o.append(value)
+            self[key] = o
+        else:
+            self[key] = value
+
+    def __repr__(self):
+        return '<{0}({1})>'.format(self.__class__.__name__,
+                                   ', '.join('{0!r}: {1!r}'.format(k, v) for k, v in self.items()))
+
+    # MutableMapping API
+    def __getitem__(self, key):
+        header = self._headers[key.lower()]
+        value = header[2]
+        if value is _MISSING:
+            value = self._decode(header)
+        return value
+
+    def __setitem__(self, key, value):
+        self._version += 1
+        header = self._headers.get(key.lower())
+        if header is None:
+            self._headers[key.lower()] = [key, None, value]
+        else:
+            header[1] = None
+            header[2] = value
+
+    def __delitem__(self, key):
+        del self._headers[key.lower()]
+        self._version += 1
+
+    def __contains__(self, key):
+        return isinstance(key, str) and key.lower() in self._headers
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __iter__(self):
+        return (header[0] for header in self._headers.values())
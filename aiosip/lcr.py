@@ -0,0 +1,152 @@
+import csv
+import logging
+import itertools
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+__all__ = ['LCR', 'LCRTable']
+
+LOG = logging.getLogger(__name__)
+
+MAX_PREFIX_LENGTH = 19
+
+
+def _leading_digits(number):
+    number = number.lstrip('+')
+    for i, c in enumerate(number):
+        if not '0' <= c <= '9':
+            return number[:i]
+    return number
+
+
+def _is_sorted(prefixes, indexes, rates):
+    for i in range(1, len(prefixes)):
+        if prefixes[i - 1] > prefixes[i] or (prefixes[i - 1] == prefixes[i] and rates[i - 1] > rates[i]):
+            return False
+    return True
+
+
+def _sort(prefixes, indexes, rates):
+    # Two stable sorts on plain keys order the rows by prefix then rate without building tuples
+    order = sorted(range(len(prefixes)), key=rates.__getitem__)
+    order.sort(key=prefixes.__getitem__)
+    return (array('Q', (prefixes[i] for i in order)),
+            array('I', (indexes[i] for i in order)),
+            array('d', (rates[i] for i in order)))
+
+
+class LCRTable:
+    """
+    Least cost routing table, matching numbers on their longest known prefix.
+
+    Prefixes are grouped by length, each group being a sorted ``array`` of the
+    prefixes as integers, so leading zeros are kept by the length, with parallel
+    arrays of trunk indexes and rates. A prefix takes 20 bytes and a lookup is a
+    bisection per prefix length. Tables are immutable, see ``LCR`` to replace
+    one at runtime.
+    """
+    def __init__(self, rows=()):
+        trunks = {}
+        self._tables = {}
+        self._size = 0
+        # Rows go straight into the arrays, only the groups that aren't sorted yet are reordered
+        for prefix, trunk, rate in rows:
+            prefix = prefix.strip().lstrip('+')
+            if not prefix.isdigit() or len(prefix) > MAX_PREFIX_LENGTH:
+                raise ValueError('Not valid prefix: {!r}'.format(prefix))
+
+            table = self._tables.get(len(prefix))
+            if table is None:
+                table = self._tables[len(prefix)] = (array('Q'), array('I'), array('d'))
+            table[0].append(int(prefix))
+            table[1].append(trunks.setdefault(trunk, len(trunks)))
+            table[2].append(float(rate))
+            self._size += 1
+
+        for length, table in self._tables.items():
+            if not _is_sorted(*table):
+                self._tables[length] = _sort(*table)
+        self.trunks = list(trunks)
+        self._lengths = sorted(self._tables, reverse=True)
+
+    @classmethod
+    def from_csv(cls, f, **kwargs):
+        """
+        Load ``prefix,trunk,rate`` rows from a path or a file object.
+
+        A first row that doesn't start with a prefix is taken for a header.
+        Remaining arguments are passed to ``csv.reader``.
+        """
+        if isinstance(f, str):
+            with open(f, newline='') as f:
+                return cls.from_csv(f, **kwargs)
+
+        rows = csv.reader(f, **kwargs)
+        first = next(rows, None)
+        if first is None:
+            return cls()
+        elif first[0].strip().lstrip('+').isdigit():
+            rows = itertools.chain([first], rows)
+        return cls(row[:3] for row in rows if row)
+
+    def lookup(self, number):
+        """
+        Trunks and rates of the longest prefix of ``number``, cheapest first.
+        """
+        digits = _leading_digits(number)
+        for length in self._lengths:
+            if length > len(digits):
+                continue
+
+            prefix = int(digits[:length])
+            prefixes, indexes, rates = self._tables[length]
+            start = bisect_left(prefixes, prefix)
+            if start < len(prefixes) and prefixes[start] == prefix:
+                end = bisect_right(prefixes, prefix, start)
+                return [(self.trunks[indexes[i]], rates[i]) for i in range(start, end)]
+        return []
+
+    def route(self, number):
+        """
+        Cheapest trunk for ``number``, None when no prefix matches.
+        """
+        routes = self.lookup(number)
+        return routes[0][0] if routes else None
+
+    def __len__(self):
+        return self._size
+
+
+class LCR:
+    """
+    Current ``LCRTable`` of an application, shared by its dialplan routes to
+    pick a trunk from the Request-URI user.
+
+    Lookups read the table once, so replacing it with ``swap`` or ``load``
+    never exposes a partially loaded table to requests being routed.
+    """
+    def __init__(self, table=None):
+        self.table = table if table is not None else LCRTable()
+
+    def swap(self, table):
+        """
+        Replace the table, return the previous one.
+        """
+        previous, self.table = self.table, table
+        LOG.debug('Swapped LCR table of %s prefixes for %s prefixes', len(previous), len(table))
+        return previous
+
+    async def load(self, f, *, loop, **kwargs):
+        """
+        Load a CSV file in a thread and swap it in once complete.
+        """
+        table = await loop.run_in_executor(None, lambda: LCRTable.from_csv(f, **kwargs))
+        return self.swap(table)
+
+    def lookup(self, number):
+        return self.table.lookup(number)
+
+    def route(self, number):
+        return self.table.route(number)
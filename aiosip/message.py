@@ -6,8 +6,12 @@ from pyquery import PyQuery
 from multidict import CIMultiDict
 
 from . import utils
+from . import parser
 from .contact import Contact
+from .param import Param
+from .via import Via, ViaStack
 from .auth import Auth
+from .headers import RawHeaders, emission_order, version as headers_version
 
 FIRST_LINE_PATTERN = {
     'request': {
@@ -22,7 +26,42 @@ FIRST_LINE_PATTERN = {
 LOG = logging.getLogger(__name__)
 
 
+def encode_stateless_response(request, status_code, status_message=None, headers=None):
+    """
+    Encode a response to ``request`` straight from its raw headers.
+
+    Nothing is parsed besides the To tag check and no message is created, the
+    caller sends the returned bytes as is.
+    """
+    to = request.headers['To']
+    if 'tag' not in request.to_details['params']:
+        to = '%s;tag=%s' % (to, utils.gen_str(16, '0123456789abcdef'))
+
+    lines = [FIRST_LINE_PATTERN['response']['str'].format(
+        status_code=status_code,
+        status_message=status_message or utils.STATUS[int(status_code)]
+    )]
+    lines.extend('Via: %s' % via for via in request.headers.getall('Via'))
+    lines.append('From: %s' % request.headers['From'])
+    lines.append('To: %s' % to)
+    lines.append('Call-ID: %s' % request.headers['Call-ID'])
+    lines.append('CSeq: %s' % request.headers['CSeq'])
+    if headers:
+        lines.extend('%s: %s' % (k, v) for k, v in headers.items())
+    lines.append('Content-Length: 0')
+    lines.append(utils.EOL)
+    return utils.EOL.join(lines).encode()
+
+
+def _details_state(details):
+    if details is None:
+        return None
+    return details, details._state()
+
+
 class Message:
+    _first_line = None
+
     def __init__(self,
                  headers=None,
                  payload=None,
@@ -51,12 +90,17 @@ class Message:
 
         self._payload = payload
         self._raw_payload = None
+        self._encoded = None
+        self._encoded_state = None
 
         if 'Via' not in self.headers:
-            self.headers['Via'] = 'SIP/2.0/%(protocol)s ' + \
-                utils.format_host_and_port(self.contact_details['uri']['host'],
-                                           self.contact_details['uri']['port']) + \
-                ';branch=%s' % utils.gen_branch(10)
+            # The protocol is filled in by the transport sending the message
+            self._via = ViaStack(Via(
+                protocol=None,
+                host=self.contact_details['uri']['host'],
+                port=self.contact_details['uri']['port'],
+                params=Param('branch=%s' % utils.gen_branch(10))
+            ))
 
     @property
     def auth(self):
@@ -111,6 +155,21 @@ class Message:
     def contact_details(self, contact_details):
         self._contact_details = contact_details
 
+    @property
+    def via(self):
+        if not hasattr(self, '_via'):
+            self._via = ViaStack(self.headers['Via'])
+        return self._via
+
+    @via.setter
+    def via(self, via):
+        self._via = via
+
+    def _set_via_protocol(self, protocol):
+        via = self.__dict__.get('_via')
+        if via is not None and via.top.protocol is None:
+            via.top.protocol = protocol
+
     @property
     def content_type(self):
         return self.headers['Content-Type']
@@ -149,15 +208,42 @@ class Message:
         return msg + self.payload
 
     def encode(self, *args, **kwargs):
+        state = self._encoding_state(args, kwargs)
+        if state is not None and state == self._encoded_state:
+            return self._encoded
+
         if self._payload:
             self._raw_payload = self._payload.encode(*args, **kwargs)
         elif not self._raw_payload:
             self._raw_payload = b''
 
         msg = self._make_headers()
-        return msg.encode(*args, **kwargs) + self._raw_payload
+        if self._first_line is not None:
+            msg = self._first_line + utils.EOL + msg
+
+        self._encoded = msg.encode(*args, **kwargs) + self._raw_payload
+        self._encoded_state = self._encoding_state(args, kwargs)
+        return self._encoded
+
+    def _encoding_state(self, args, kwargs):
+        version = headers_version(self.headers)
+        if version is None:
+            return None
+
+        return (self.headers, version,
+                _details_state(self.__dict__.get('_from_details')),
+                _details_state(self.__dict__.get('_to_details')),
+                _details_state(self.__dict__.get('_contact_details')),
+                _details_state(self.__dict__.get('_via')),
+                self.__dict__.get('_cseq'), self.__dict__.get('_method'),
+                self._first_line, self._payload, self._raw_payload,
+                args, kwargs)
 
     def _make_headers(self):
+        if hasattr(self, '_via'):
+            values = self.via.values()
+            self.headers['Via'] = values[0] if len(values) == 1 else values
+
         if hasattr(self, '_from_details'):
             self.headers['From'] = str(self.from_details)
 
@@ -182,17 +268,13 @@ class Message:
 
     def _format_headers(self):
         msg = []
-        for k, v in sorted(self.headers.items()):
-            if k == 'Via':
-                if isinstance(v, (list, tuple)):
-                    msg = ['%s: %s' % (k, i) for i in v] + msg
-                else:
-                    msg.insert(0, '%s: %s' % (k, v))
+        items = list(self.headers.items())
+        for index in emission_order(tuple(k for k, _ in items)):
+            k, v = items[index]
+            if isinstance(v, (list, tuple)):
+                msg.extend(['%s: %s' % (k, i) for i in v])
             else:
-                if isinstance(v, (list, tuple)):
-                    msg.extend(['%s: %s' % (k, i) for i in v])
-                else:
-                    msg.append('%s: %s' % (k, v))
+                msg.append('%s: %s' % (k, v))
         msg.append(utils.EOL)
         return utils.EOL.join(msg)
 
@@ -204,39 +286,39 @@ class Message:
         return PyQuery(self.payload).remove_namespaces()
 
     @classmethod
-    def from_raw_headers(cls, raw_headers):
-        headers = CIMultiDict()
-        decoded_headers = raw_headers.decode().split(utils.EOL)
-        for line in decoded_headers[1:]:
-            k, v = line.split(': ', 1)
-            if k in headers:
-                o = headers.setdefault(k, [])
-                if not isinstance(o, list):
-                    o = [o]
-                o.append(v)
-                headers[k] = o
-            else:
-                headers[k] = v
-
-        m = FIRST_LINE_PATTERN['response']['regex'].match(decoded_headers[0])
-        if m:
-            d = m.groupdict()
-            return Response(status_code=int(d['status_code']),
-                            status_message=d['status_message'],
+    def from_raw_headers(cls, raw_headers, end=None):
+        raw_headers = parser.as_bytes(raw_headers)
+        first_line, fields = parser.parse_headers(raw_headers, 0, end)
+        headers = RawHeaders(raw_headers, fields)
+
+        try:
+            method, status_code, status_message = parser.parse_first_line(first_line)
+        except ValueError:
+            LOG.debug(first_line)
+            raise
+
+        if status_code:
+            return Response(status_code=status_code,
+                            status_message=status_message,
                             headers=headers,
-                            first_line=decoded_headers[0])
+                            first_line=first_line)
         else:
-            m = FIRST_LINE_PATTERN['request']['regex'].match(decoded_headers[0])
-            if m:
-                d = m.groupdict()
-                cseq, _ = headers['CSeq'].split()
-                return Request(method=d['method'],
-                               headers=headers,
-                               cseq=int(cseq),
-                               first_line=decoded_headers[0])
-            else:
-                LOG.debug(decoded_headers)
-                raise ValueError('Not a SIP message')
+            cseq, _ = headers['CSeq'].split()
+            return Request(method=method,
+                           headers=headers,
+                           cseq=int(cseq),
+                           first_line=first_line)
+
+    @classmethod
+    def from_raw(cls, data):
+        data = parser.as_bytes(data)
+        end = parser.find_headers_end(data)
+        if end < 0:
+            raise ValueError('Not a SIP message')
+
+        msg = cls.from_raw_headers(data, end)
+        msg._raw_payload = data[end + len(parser.HEADERS_END):]
+        return msg
 
 
 class Request(Message):
@@ -285,9 +367,6 @@ class Request(Message):
     def __str__(self):
         return '%s%s%s' % (self._first_line, utils.EOL, super().__str__())
 
-    def encode(self, *args, **kwargs):
-        return self._first_line.encode(*args, **kwargs) + utils.BYTES_EOL + super().encode(*args, **kwargs)
-
 
 class Response(Message):
     def __init__(self,
@@ -366,7 +445,7 @@ class Response(Message):
             headers = CIMultiDict()
 
         if 'Via' not in headers:
-            headers['Via'] = request.headers['Via']
+            headers['Via'] = request.via.values()
 
         return Response(
             status_code=status_code,
@@ -382,6 +461,3 @@ class Response(Message):
 
     def __str__(self):
         return '%s%s%s' % (self._first_line, utils.EOL, super().__str__())
-
-    def encode(self, *args, **kwargs):
-        return self._first_line.encode(*args, **kwargs) + utils.BYTES_EOL + super().encode(*args, **kwargs)
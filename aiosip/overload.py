@@ -0,0 +1,81 @@
+import math
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+MAX_RETRY_AFTER = 3600
+
+
+class OverloadController:
+    """
+    Decide when an application must turn new requests away.
+
+    The event loop lag is sampled every ``interval`` seconds, as the delay of a
+    callback past its due time, and smoothed. The application is overloaded
+    while the lag or the number of live client and server transactions exceeds
+    its threshold. Thresholds must be positive and are ignored when left to
+    None. Rejected requests are told to retry after ``retry_after`` seconds,
+    scaled by how far over its threshold the application is.
+    """
+    def __init__(self, app, max_lag=None, max_transactions=None, retry_after=5, interval=0.1, *, loop=None):
+        self.app = app
+        self.max_lag = max_lag
+        self.max_transactions = max_transactions
+        self.retry_after = retry_after
+        self.interval = interval
+        self.loop = loop
+        self.lag = 0.0
+        self.rejected = 0
+        self._handle = None
+        self._due = None
+
+    def start(self):
+        if self._handle is None and self.max_lag is not None:
+            self._due = self.loop.time() + self.interval
+            self._handle = self.loop.call_at(self._due, self._sample)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _sample(self):
+        now = self.loop.time()
+        self.lag += (max(0.0, now - self._due) - self.lag) / 4
+        self._due = now + self.interval
+        self._handle = self.loop.call_at(self._due, self._sample)
+
+    def load(self):
+        """
+        Ratio of the most loaded metric to its threshold, above 1 when overloaded.
+        """
+        load = 0.0
+        if self.max_lag is not None:
+            load = self.lag / self.max_lag
+        if self.max_transactions is not None:
+            load = max(load, self.transactions / self.max_transactions)
+        return load
+
+    @property
+    def transactions(self):
+        return len(self.app._transactions) + len(self.app._server_transactions)
+
+    @property
+    def overloaded(self):
+        return self.load() > 1
+
+    def reject(self):
+        """
+        Count a rejected request, return its Retry-After delay in seconds.
+        """
+        self.rejected += 1
+        return min(MAX_RETRY_AFTER, math.ceil(self.retry_after * min(self.load(), MAX_RETRY_AFTER)))
+
+    def state(self):
+        return {
+            'overloaded': self.overloaded,
+            'lag': self.lag,
+            'transactions': self.transactions,
+            'rejected': self.rejected,
+        }
@@ -1,31 +1,66 @@
+from types import MappingProxyType
 from collections.abc import MutableMapping
 
 
 class Param(MutableMapping):
+    __slots__ = ('_param', '_version')
+
     def __init__(self, param=''):
         if param:
-            self._param = dict(item.split("=") for item in param.split(";") if '=' in item)
+            # Parameters without a value, like lr or rport, are stored as None
+            self._param = {key.strip(): value.strip() if sep else None
+                           for key, sep, value in (item.partition('=') for item in param.split(';'))
+                           if key.strip()} or None
         else:
+            self._param = None  # Most params are empty, only allocate a dict when needed
+        self._version = 0
+
+    def copy(self):
+        """
+        Return a copy sharing the parameters until one of them is modified.
+        """
+        if type(self._param) is dict:
+            self._param = MappingProxyType(self._param)
+
+        param = Param.__new__(Param)
+        param._param = self._param
+        param._version = 0
+        return param
+
+    def _writable(self):
+        if self._param is None:
             self._param = {}
+        elif type(self._param) is not dict:
+            self._param = dict(self._param)
+        return self._param
 
     def __str__(self):
-        return ';'.join('{}={}'.format(key, val) for key, val in self.items())
+        return ';'.join(key if val is None else '{}={}'.format(key, val) for key, val in self.items())
 
     # MutableMapping API
     def __eq__(self, other):
         return self is other
 
     def __getitem__(self, key):
+        if self._param is None:
+            raise KeyError(key)
         return self._param[key]
 
     def __setitem__(self, key, value):
-        self._param[key] = value
+        self._writable()[key] = value
+        self._version += 1
 
     def __delitem__(self, key):
-        del self._param[key]
+        if self._param is None:
+            raise KeyError(key)
+        del self._writable()[key]
+        self._version += 1
+
+    def __contains__(self, key):
+        return self._param is not None and key in self._param
 
     def __len__(self):
-        return len(self._param)
+        return len(self._param) if self._param else 0
 
     def __iter__(self):
-        return iter(self._param)
+        return iter(self._param or ())
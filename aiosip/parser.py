@@ -0,0 +1,76 @@
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+HEADERS_END = b'\r\n\r\n'
+BYTES_EOL = b'\r\n'
+SIP_VERSION = 'SIP/2.0'
+
+
+def as_bytes(data):
+    if isinstance(data, memoryview):
+        if data.contiguous and data.nbytes == len(data.obj):
+            return data.obj
+        return data.tobytes()
+    return data
+
+
+def find_headers_end(data, start=0):
+    return data.find(HEADERS_END, start)
+
+
+def parse_headers(data, start=0, end=None):
+    """
+    Scan a raw header block in a single pass.
+
+    Return the decoded first line and a list of ``(name, value_start, value_end)``
+    tuples. Values are left as offsets into ``data`` and only decoded on demand.
+    """
+    data = as_bytes(data)
+    if end is None:
+        end = data.find(HEADERS_END, start)
+        if end < 0:
+            end = len(data)
+
+    eol = data.find(BYTES_EOL, start, end)
+    if eol < 0:
+        eol = end
+    first_line = data[start:eol].decode()
+
+    fields = []
+    pos = eol + 2
+    while pos < end:
+        eol = data.find(BYTES_EOL, pos, end)
+        if eol < 0:
+            eol = end
+
+        colon = data.find(b':', pos, eol)
+        if colon < 0:
+            raise ValueError('Malformed header line')
+
+        value_start = colon + 1
+        while value_start < eol and data[value_start] in (32, 9):  # SP, HTAB
+            value_start += 1
+
+        fields.append((data[pos:colon].rstrip().decode(), value_start, eol))
+        pos = eol + 2
+
+    return first_line, fields
+
+
+def parse_first_line(first_line):
+    """
+    Return ``(method, status_code, status_message)`` for a start line.
+    """
+    if first_line.startswith('SIP/2.0 '):
+        status_code = first_line[8:11]
+        if not status_code.isdigit() or len(first_line) < 13:
+            raise ValueError('Not a SIP message')
+        return None, int(status_code), first_line[12:]
+
+    method, _, rest = first_line.partition(' ')
+    to_uri, _, version = rest.rpartition(' ')
+    if version != SIP_VERSION or not to_uri or not method.isalpha():
+        raise ValueError('Not a SIP message')
+    return method, None, None
@@ -9,8 +9,10 @@ from multidict import CIMultiDict
 from . import utils
 from . import exceptions
 from .contact import Contact
+from .message import Request, Response
 from .protocol import UDP, TCP, WS
-from .dialog import Dialog, InviteDialog
+from .dialog import Dialog, InviteDialog, OutOfDialog
+from .transaction import FutureTransaction
 
 LOG = logging.getLogger(__name__)
 
@@ -23,6 +25,8 @@ class Peer:
         self._loop = loop
         self._connected_future = asyncio.Future(loop=loop)
         self._disconnected_future = asyncio.Future(loop=loop)
+        self.srtt = None
+        self.rttvar = None
 
     async def close(self):
         if self._protocol is not None:
@@ -31,8 +35,30 @@ class Peer:
             await self._disconnected_future
 
     def send_message(self, msg):
+        if isinstance(msg, Response):
+            self._app._response_sent(self, msg)
         self._protocol.send_message(msg, addr=self.peer_addr)
 
+    def _default_contact(self, from_details):
+        host, port = self.local_addr
+
+        # No way to get the public local addr in UDP. Allow an override or select the From host
+        # Maybe with https://bugs.python.org/issue31203
+        if self._app.defaults['override_contact_host']:
+            host = self._app.defaults['override_contact_host']
+        elif host == '0.0.0.0' or host.startswith('127.'):
+            host = from_details['uri']['host']
+
+        return Contact(
+            {
+                'uri': 'sip:{username}@{host_and_port};transport={protocol}'.format(
+                    username=from_details['uri']['user'],
+                    host_and_port=utils.format_host_and_port(host, port),
+                    protocol=type(self._protocol).__name__.lower()
+                )
+            }
+        )
+
     def _create_dialog(self, method, from_details, to_details, contact_details=None, password=None, call_id=None,
                        headers=None, payload=None, cseq=0, inbound=False, dialog_factory=Dialog, **kwargs):
 
@@ -42,24 +68,7 @@ class Peer:
             call_id = str(uuid.uuid4())
 
         if not contact_details:
-            host, port = self.local_addr
-
-            # No way to get the public local addr in UDP. Allow an override or select the From host
-            # Maybe with https://bugs.python.org/issue31203
-            if self._app.defaults['override_contact_host']:
-                host = self._app.defaults['override_contact_host']
-            elif host == '0.0.0.0' or host.startswith('127.'):
-                host = from_details['uri']['host']
-
-            contact_details = Contact(
-                {
-                    'uri': 'sip:{username}@{host_and_port};transport={protocol}'.format(
-                        username=from_details['uri']['user'],
-                        host_and_port=utils.format_host_and_port(host, port),
-                        protocol=type(self._protocol).__name__.lower()
-                    )
-                }
-            )
+            contact_details = self._default_contact(from_details)
 
         dialog = dialog_factory(
             method=method,
@@ -78,10 +87,7 @@ class Peer:
         )
 
         LOG.debug('Creating: %s', dialog)
-        self._app._dialogs[dialog.dialog_id] = dialog
-        self._app._dialogs[
-            frozenset((dialog.original_msg.to_details['params'].get('tag'), None, dialog.call_id))
-        ] = dialog
+        self._app._dialogs.add(dialog)
         return dialog
 
     async def request(self, method, from_details, to_details, contact_details=None, password=None, call_id=None,
@@ -111,6 +117,43 @@ class Peer:
             await dialog.close(fast=True)
             raise
 
+    async def send_request(self, method, from_details, to_details, contact_details=None, password=None,
+                           call_id=None, headers=None, cseq=1, payload=None):
+        """
+        Send a request outside of any dialog and return its final response.
+
+        Only a client transaction is created, for one-shot requests like
+        MESSAGE, PUBLISH or out-of-dialog NOTIFY and INFO.
+        """
+        if method.upper() == 'INVITE':
+            raise ValueError('INVITE creates a dialog, use invite()')
+
+        from_details.add_tag()
+
+        headers = CIMultiDict(headers or {})
+        if 'User-Agent' not in headers:
+            headers['User-Agent'] = self._app.defaults['user_agent']
+        headers['Call-ID'] = call_id or str(uuid.uuid4())
+
+        msg = Request(
+            method=method,
+            cseq=cseq,
+            from_details=from_details,
+            to_details=to_details,
+            contact_details=contact_details or self._default_contact(from_details),
+            headers=headers,
+            payload=payload,
+        )
+
+        owner = OutOfDialog(self._app, self, password=password)
+        transaction = FutureTransaction(owner, original_msg=msg, loop=self._loop)
+        owner.transactions.add(transaction)
+        try:
+            return await transaction.start()
+        except asyncio.CancelledError:
+            transaction.close()
+            raise
+
     async def subscribe(self, expires=3600, **kwargs):
 
         if expires:
@@ -139,6 +182,33 @@ class Peer:
     def protocol(self):
         return type(self._protocol)
 
+    @property
+    def t1(self):
+        """
+        Retransmission base of the transactions with this peer.
+
+        Derived from the measured round-trip times like a TCP retransmission
+        timeout (RFC 6298) and kept within the ``t1_min`` and ``t1_max`` defaults.
+        ``t1_min`` defaults to the configured ``t1``, lowering ``t1`` lets peers
+        on fast links adapt down to it.
+        """
+        defaults = self._app.defaults
+        if self.srtt is None:
+            return defaults['t1']
+
+        t1_min = defaults['t1_min']
+        if t1_min is None:
+            t1_min = defaults['t1']
+        return min(max(self.srtt + 4 * self.rttvar, t1_min), defaults['t1_max'])
+
+    def _rtt_sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
     @property
     def connected(self):
         return self._connected_future
@@ -2,28 +2,34 @@ import asyncio
 import logging
 
 from . import message
+from .framer import StreamFramer
 
 
 LOG = logging.getLogger(__name__)
 
 
 class UDP(asyncio.DatagramProtocol):
+    reliable = False
+
     def __init__(self, app, loop):
         self.app = app
         self.via = 'UDP'
         self.loop = loop
         self.transport = None
         self.ready = asyncio.Future()
+        self.inflight = 0
+        self.dropped = 0
 
     def send_message(self, msg, addr):
-        if isinstance(msg.headers['Via'], str):
-            msg.headers['Via'] %= {'protocol': self.via}
-        else:
-            msg.headers['Via'][0] %= {'protocol': self.via}
+        msg._set_via_protocol(self.via)
 
         LOG.log(5, 'Sending to: "%s" via UDP: "%s"', addr, msg)
         self.transport.sendto(msg.encode(), addr)
 
+    def send_raw(self, data, addr):
+        LOG.log(5, 'Sending to: "%s" via UDP: "%s"', addr, data)
+        self.transport.sendto(data, addr)
+
     def connection_lost(self, error):
         self.app._connection_lost(self)
 
@@ -35,31 +41,41 @@ class UDP(asyncio.DatagramProtocol):
         if data == b'\r\n\r\n':
             return
 
-        headers, data = data.split(b'\r\n\r\n', 1)
-        msg = message.Message.from_raw_headers(headers)
-        msg._raw_payload = data
+        msg = message.Message.from_raw(data)
         LOG.log(5, 'Received from "%s" via UDP: "%s"', addr, msg)
-        asyncio.ensure_future(self.app._dispatch(self, msg, addr))
+        if self.app._retransmission(msg):
+            return
+        elif self.app._over_limit(self):
+            # Datagrams can't be pushed back, shed the load instead
+            self.app._reject(self, msg, addr)
+        else:
+            self.app._dispatch_later(self, msg, addr)
 
 
 class TCP(asyncio.Protocol):
+    reliable = True
+
     def __init__(self, app, loop):
         self.app = app
         self.via = 'TCP'
         self.loop = loop
         self.transport = None
         self.ready = asyncio.Future()
-        self._data = b''
+        self.inflight = 0
+        self._paused = False
+        self._framer = StreamFramer(max_headers_size=app.defaults['max_headers_size'],
+                                    max_body_size=app.defaults['max_body_size'])
 
     def send_message(self, msg, addr=None):
-        if isinstance(msg.headers['Via'], str):
-            msg.headers['Via'] %= {'protocol': self.via}
-        else:
-            msg.headers['Via'][0] %= {'protocol': self.via}
+        msg._set_via_protocol(self.via)
 
         LOG.log(5, 'Sent via TCP: "%s"', msg)
         self.transport.write(msg.encode())
 
+    def send_raw(self, data, addr=None):
+        LOG.log(5, 'Sent via TCP: "%s"', data)
+        self.transport.write(data)
+
     def connection_lost(self, error):
         self.app._connection_lost(self)
 
@@ -71,21 +87,36 @@ class TCP(asyncio.Protocol):
 
     def data_received(self, data):
         LOG.log(3, 'Received on socket %s', data)
-        if data == b'\r\n\r\n':
-            return
-
-        self._data += data
-        while b'\r\n\r\n' in self._data:
-            headers, self._data = self._data.split(b'\r\n\r\n', 1)
-            msg = message.Message.from_raw_headers(headers)
-            content_length = int(msg.headers['Content-Length'])
-            msg._raw_payload, self._data = self._data[:content_length], self._data[content_length:]
-            # assert len(msg._raw_payload) == int(msg.headers['Content-Length'])
-            LOG.log(5, 'Received via TCP: "%s"', msg)
-            asyncio.ensure_future(self.app._dispatch(self, msg, None))
+        frames = self._framer.feed(data)
+        if not self._paused:
+            self._dispatch(frames)
+
+    def _dispatch(self, frames):
+        try:
+            for msg in frames:
+                LOG.log(5, 'Received via TCP: "%s"', msg)
+                self.app._dispatch_later(self, msg, None)
+                if self._paused:
+                    # The rest of the burst stays in the framer until reading resumes
+                    return
+        except ValueError as e:
+            LOG.warning('Closing TCP connection to %s: %s', self.transport.get_extra_info('peername'), e)
+            self.transport.close()
+
+    def pause_reading(self):
+        self._paused = True
+        self.transport.pause_reading()
+
+    def resume_reading(self):
+        self._paused = False
+        self._dispatch(self._framer.feed(b''))
+        if not self._paused:
+            self.transport.resume_reading()
 
 
 class WS:
+    reliable = True
+
     def __init__(self, app, loop, local_addr, peer_addr, websocket):
         self.app = app
         self.loop = loop
@@ -97,6 +128,9 @@ class WS:
             self.via = 'WS'
         self.transport = self
         self.websocket = websocket
+        self.inflight = 0
+        self._reading = asyncio.Event()
+        self._reading.set()
         self.websocket_pump = asyncio.ensure_future(self.run())
 
     def close(self):
@@ -108,28 +142,34 @@ class WS:
         elif key == 'peername':
             return self.peer_addr
 
+    def pause_reading(self):
+        self._reading.clear()
+
+    def resume_reading(self):
+        self._reading.set()
+
     def send_message(self, msg, addr):
-        if isinstance(msg.headers['Via'], str):
-            msg.headers['Via'] %= {'protocol': self.via}
-        else:
-            msg.headers['Via'][0] %= {'protocol': self.via}
+        msg._set_via_protocol(self.via)
 
         LOG.log(5, 'Sending via %s: "%s"', self.via, msg)
         asyncio.ensure_future(self.websocket.send(msg.encode().decode('utf8')))
 
+    def send_raw(self, data, addr):
+        LOG.log(5, 'Sending via %s: "%s"', self.via, data)
+        asyncio.ensure_future(self.websocket.send(data.decode('utf8')))
+
     async def run(self):
         while self.websocket.open:
+            await self._reading.wait()
             try:
                 data = await self.websocket.recv()
             except Exception:
                 break
             if isinstance(data, str):
                 data = data.encode('utf8')
-            headers, data = data.split(b'\r\n\r\n', 1)
-            msg = message.Message.from_raw_headers(headers)
-            msg._raw_payload = data
+            msg = message.Message.from_raw(data)
             LOG.log(5, 'Received via %s: "%s"', self.via, msg)
-            asyncio.ensure_future(self.app._dispatch(self, msg, self.peer_addr))
+            self.app._dispatch_later(self, msg, self.peer_addr)
 
         await self.websocket.close()
         self.app._connection_lost(self)
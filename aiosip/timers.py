@@ -0,0 +1,259 @@
+import heapq
+import asyncio
+import logging
+import itertools
+
+
+LOG = logging.getLogger(__name__)
+
+# RFC 3261 - 17.1.1.1
+T1 = 0.5
+T2 = 4
+T4 = 5
+
+
+class Timer:
+    __slots__ = ('callback', 'args', 'expires', '_wheel', '_slot')
+
+    def __init__(self, wheel, callback, args, expires):
+        self.callback = callback
+        self.args = args
+        self.expires = expires
+        self._wheel = wheel
+        self._slot = None
+
+    def cancel(self):
+        if self._slot is not None:
+            del self._slot[self]
+            self._slot = None
+            self._wheel._count -= 1
+
+    def cancelled(self):
+        return self._slot is None
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel shared by the transactions of an application.
+
+    Timers are kept in ``levels`` wheels of ``slots`` slots, a slot of level n
+    covering ``resolution * slots ** n`` seconds. A single loop callback
+    advances the wheel each ``resolution`` while timers are pending, firing the
+    current slot of the first level and moving the timers of upper levels down
+    as their time comes. Scheduling and cancelling a timer are O(1).
+    """
+    def __init__(self, resolution=0.01, slots=64, levels=4, *, loop=None):
+        self.resolution = resolution
+        self.slots = slots
+        self.loop = loop
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._span = slots ** levels
+        self._tick = 0
+        self._start = None
+        self._handle = None
+        self._count = 0
+
+    def schedule(self, delay, callback, *args):
+        """
+        Call ``callback(*args)`` in ``delay`` seconds, return a ``Timer`` that can be cancelled.
+        """
+        now = self._current_tick()
+        if self._handle is None:
+            # The wheel is idle, catch up with the loop clock
+            self._tick = now
+
+        expires = max(now + int(-(-delay // self.resolution)), self._tick + 1)
+        timer = Timer(self, callback, args, expires)
+        self._insert(timer)
+        self._count += 1
+
+        if self._handle is None:
+            self._handle = self.loop.call_at(self._tick_time(self._tick + 1), self._advance)
+        return timer
+
+    def _current_tick(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        if self._start is None:
+            self._start = self.loop.time()
+        return int((self.loop.time() - self._start) / self.resolution)
+
+    def _tick_time(self, tick):
+        return self._start + tick * self.resolution
+
+    def _insert(self, timer):
+        # Timers beyond the span of the wheels are parked in the furthest slot and moved again from there
+        index = min(timer.expires, self._tick + self._span - 1)
+        delta = index - self._tick
+        level = 0
+        while delta >= self.slots:
+            delta //= self.slots
+            index //= self.slots
+            level += 1
+
+        slot = self._wheels[level][index % self.slots]
+        slot[timer] = None
+        timer._slot = slot
+
+    def _advance(self):
+        target = self._current_tick()
+        while self._tick < target and self._count:
+            self._tick += 1
+            self._cascade()
+
+            slot = self._wheels[0][self._tick % self.slots]
+            while slot:
+                timer = next(iter(slot))
+                if timer.expires > self._tick:
+                    del slot[timer]
+                    self._insert(timer)
+                    continue
+
+                timer.cancel()
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    LOG.exception(e)
+
+        if self._count:
+            self._handle = self.loop.call_at(self._tick_time(self._tick + 1), self._advance)
+        else:
+            self._handle = None
+
+    def _cascade(self):
+        tick = self._tick
+        for wheel in self._wheels[1:]:
+            if tick % self.slots:
+                return
+            tick //= self.slots
+            slot = wheel[tick % self.slots]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._insert(timer)
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for wheel in self._wheels:
+            for slot in wheel:
+                for timer in list(slot):
+                    timer.cancel()
+
+    def __len__(self):
+        return self._count
+
+
+class ExpiryIndex:
+    """
+    Deadlines of long lived objects, such as dialogs waiting to be closed.
+
+    Moving the deadline of an object only updates a dict: the heap keeps one
+    live entry per object, at its earliest deadline, and entries that surface
+    before the current deadline are pushed back. Heap entries refer to objects
+    through a sequence number, so a cancelled object is released right away,
+    and the heap is compacted once most of its entries are stale. A single loop
+    callback fires every ``resolution`` seconds at most, handing all the
+    expired objects to ``callback`` as one batch.
+    """
+    def __init__(self, callback, resolution=1, *, loop=None):
+        self.callback = callback
+        self.resolution = resolution
+        self.loop = loop
+        self._heap = []
+        self._deadlines = {}
+        self._queued = {}
+        self._keys = {}
+        self._counter = itertools.count()
+        self._handle = None
+        self._when = None
+
+    def schedule(self, key, delay):
+        """
+        Expire ``key`` in ``delay`` seconds, replacing any previous deadline.
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        deadline = self.loop.time() + delay
+        self._deadlines[key] = deadline
+        queued = self._queued.get(key)
+        if queued is None or deadline < queued[0]:
+            self._push(key, deadline)
+            self._arm()
+
+    def cancel(self, key):
+        if self._deadlines.pop(key, None) is not None:
+            self._dequeue(key)
+
+    def deadline(self, key):
+        return self._deadlines.get(key)
+
+    def _push(self, key, deadline):
+        self._dequeue(key)
+        entry = deadline, next(self._counter)
+        self._queued[key] = entry
+        self._keys[entry[1]] = key
+        heapq.heappush(self._heap, entry)
+
+    def _dequeue(self, key):
+        entry = self._queued.pop(key, None)
+        if entry is None:
+            return
+
+        # The heap entry is left behind, drop stale entries once they outnumber the live ones
+        del self._keys[entry[1]]
+        if len(self._heap) > 2 * len(self._keys) + 64:
+            self._heap = [entry for entry in self._heap if entry[1] in self._keys]
+            heapq.heapify(self._heap)
+
+    def _arm(self):
+        if not self._heap:
+            return
+
+        # Round up so that deadlines close to each other expire together
+        when = -(-self._heap[0][0] // self.resolution) * self.resolution
+        if self._handle is not None:
+            if self._when <= when:
+                return
+            self._handle.cancel()
+        self._when = when
+        self._handle = self.loop.call_at(when, self._expire)
+
+    def _expire(self):
+        self._handle = None
+        now = self.loop.time()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, n = heapq.heappop(self._heap)
+            key = self._keys.pop(n, None)
+            if key is None:
+                continue  # Cancelled or superseded by an earlier entry
+            del self._queued[key]
+
+            deadline = self._deadlines[key]
+            if deadline > now:
+                self._push(key, deadline)
+            else:
+                del self._deadlines[key]
+                expired.append(key)
+
+        self._arm()
+        if expired:
+            try:
+                self.callback(expired)
+            except Exception as e:
+                LOG.exception(e)
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._heap.clear()
+        self._deadlines.clear()
+        self._queued.clear()
+        self._keys.clear()
+
+    def __len__(self):
+        return len(self._deadlines)
@@ -2,6 +2,7 @@ import asyncio
 import logging
 
 from aiosip.auth import Auth
+from . import utils
 from .exceptions import AuthentificationFailed
 
 
@@ -14,8 +15,12 @@ class BaseTransaction:
         self.original_msg = original_msg
         self.loop = loop or asyncio.get_event_loop()
         self.attempts = attempts
-        self.retransmission = None
-        self.authentification = None
+        self.retransmission = None  # Timer A or E
+        self.timeout = None  # Timer B or F
+        self.completed = None  # Timer K
+        self._interval = None
+        self._sent_at = None
+        self._key = None
         self._running = True
         LOG.debug('Creating: %s', self)
 
@@ -23,13 +28,16 @@ class BaseTransaction:
         raise NotImplementedError
 
     def _incoming(self, msg):
-        if self.retransmission:
-            self.retransmission.cancel()
-            self.retransmission = None
+        if self._sent_at is not None and msg.method != 'ACK':
+            # Karn's algorithm, the first response only measures the round-trip if the request wasn't resent
+            self.dialog.peer._rtt_sample(self.loop.time() - self._sent_at)
+            self._sent_at = None
 
-        if self.authentification and msg.status_code not in (401, 407):
-            self.authentification.cancel()
-            self.authentification = None
+        if msg.method == 'ACK' or msg.status_code >= 200 or self.original_msg.method == 'INVITE':
+            self._cancel_timers()
+        elif self.retransmission:
+            # RFC 3261 - 17.1.2.2: provisional responses slow non-INVITE retransmissions down to T2
+            self._interval = self.dialog.app.defaults['t2']
 
     def _error(self, error):
         raise NotImplementedError
@@ -40,17 +48,60 @@ class BaseTransaction:
     def close(self):
         self._running = False
         LOG.debug('Closing %s', self)
+        self._unregister()
+        self._cancel_timers()
+        if self.completed:
+            self.completed.cancel()
+            self.completed = None
+
+    def _register(self):
+        # RFC 3261 - 17.1.3: responses are matched on the branch and method of the request
+        self._unregister()
+        self._key = self.original_msg.via.branch, self.original_msg.method
+        self.dialog.app._transactions[self._key] = self
+
+    def _unregister(self):
+        if self._key is not None and self.dialog.app._transactions.get(self._key) is self:
+            del self.dialog.app._transactions[self._key]
+        self._key = None
+
+    def _start_timers(self):
+        self._cancel_timers()
+        self._register()
+        self.dialog.peer.send_message(self.original_msg)
+        self._sent_at = self.loop.time()
+
+        t1 = self.dialog.peer.t1
+        timers = self.dialog.app._timers
+        if not self._reliable():
+            self._interval = t1
+            self.retransmission = timers.schedule(self._interval, self._retransmit)
+        self.timeout = timers.schedule(64 * t1, self._timeout)
+
+    def _reliable(self):
+        # RFC 3261 - 17.1.1.2 and 17.1.2.2: no retransmissions over reliable transports
+        return getattr(self.dialog.peer.protocol, 'reliable', False)
+
+    def _cancel_timers(self):
         if self.retransmission:
             self.retransmission.cancel()
             self.retransmission = None
+        if self.timeout:
+            self.timeout.cancel()
+            self.timeout = None
 
-    async def _timer(self, timeout=0.5):
-        max_timeout = timeout * 64
-        while timeout <= max_timeout:
-            self.dialog.peer.send_message(self.original_msg)
-            await asyncio.sleep(timeout)
-            timeout *= 2
+    def _retransmit(self):
+        self.dialog.peer.send_message(self.original_msg)
+        self._sent_at = None
+        if self.original_msg.method == 'INVITE':
+            self._interval *= 2
+        else:
+            self._interval = min(self._interval * 2, self.dialog.app.defaults['t2'])
+        self.retransmission = self.dialog.app._timers.schedule(self._interval, self._retransmit)
 
+    def _timeout(self):
+        self.timeout = None
+        self._cancel_timers()
         self._error(asyncio.TimeoutError('SIP timer expired for {cseq}, {method}, {call_id}'.format(
             cseq=self.original_msg.cseq,
             method=self.original_msg.method,
@@ -65,9 +116,6 @@ class BaseTransaction:
         if self.attempts < 1:
             self._error(AuthentificationFailed('Too many unauthorized attempts!'))
             return
-        elif self.authentification:
-            self.authentification.cancel()
-            self.authentification = None
 
         if msg.method.upper() == 'REGISTER':
             username = msg.to_details['uri']['user']
@@ -75,6 +123,8 @@ class BaseTransaction:
             username = msg.from_details['uri']['user']
 
         self.original_msg.cseq += 1
+        # A new request, it must not be mistaken for a retransmission
+        self.original_msg.via.top.params['branch'] = utils.gen_branch(10)
         self.original_msg.headers['Authorization'] = msg.auth.generate_authorization(
             username=username,
             password=self.dialog.password,
@@ -82,8 +132,7 @@ class BaseTransaction:
             uri=msg.to_details['uri'].short_uri()
         )
 
-        self.dialog.transactions[self.original_msg.method][self.original_msg.cseq] = self
-        self.authentification = asyncio.ensure_future(self._timer())
+        self._start_timers()
 
     def _handle_proxy_authenticate(self, msg):
         self._handle_proxy_authenticate(msg)
@@ -113,10 +162,14 @@ class FutureTransaction(BaseTransaction):
         self._future = self.loop.create_future()
 
     async def start(self):
-        self.retransmission = asyncio.ensure_future(self._timer())
+        self._start_timers()
         return await self._future
 
     def _incoming(self, msg):
+        if self._future.done():
+            # Retransmission of the final response while waiting for Timer K
+            return
+
         super()._incoming(msg)
         if msg.method == 'ACK':
             self._result(msg)
@@ -135,17 +188,23 @@ class FutureTransaction(BaseTransaction):
             self._result(msg)
 
     def _error(self, error):
-        if self.authentification:
-            self.authentification.cancel()
-            self.authentification = None
+        if self._future.done():
+            return
+        self._cancel_timers()
         self._future.set_exception(error)
         self.dialog.end_transaction(self)
 
     def _result(self, msg):
-        if self.authentification:
-            self.authentification.cancel()
-            self.authentification = None
+        self._cancel_timers()
         self._future.set_result(msg)
+        if self.original_msg.method == 'INVITE' or msg.method == 'ACK' or self._reliable():
+            self.dialog.end_transaction(self)
+        else:
+            # RFC 3261 - 17.1.2.2: Timer K, absorb retransmissions of the final response
+            self.completed = self.dialog.app._timers.schedule(self.dialog.app.defaults['t4'], self._end)
+
+    def _end(self):
+        self.completed = None
         self.dialog.end_transaction(self)
 
     def close(self):
@@ -160,3 +219,45 @@ class UnreliableTransaction(FutureTransaction):
         if self._running and not self._future.done():
                 self.dialog.cancel(cseq=self.original_msg.cseq)
         super().close()
+
+
+class ServerTransaction:
+    """
+    RFC 3261 - 17.2 server transaction of a request received over an unreliable transport.
+
+    Retransmissions of the request are absorbed, the last response sent for it
+    is sent again instead. The transaction ends 64*T1 after its last activity.
+    """
+    __slots__ = ('app', 'key', 'peer', 'response', '_expiry')
+
+    def __init__(self, app, key):
+        self.app = app
+        self.key = key
+        self.peer = None
+        self.response = None
+        self._expiry = None
+        self._expire_later()
+
+    def _expire_later(self):
+        if self._expiry:
+            self._expiry.cancel()
+        self._expiry = self.app._timers.schedule(64 * self.app.defaults['t1'], self._expire)
+
+    def _expire(self):
+        self._expiry = None
+        if self.app._server_transactions.get(self.key) is self:
+            del self.app._server_transactions[self.key]
+
+    def retransmitted(self):
+        if self.response is not None:
+            LOG.debug('Request retransmitted, sending again: %s', self.response)
+            self.peer.send_message(self.response)
+        self._expire_later()
+
+    def respond(self, peer, response):
+        self.peer = peer
+        self.response = response
+        self._expire_later()
+
+    def __repr__(self):
+        return '<{0} branch={1}, method={2}>'.format(self.__class__.__name__, *self.key)
@@ -1,61 +1,101 @@
-import re
 import logging
-
-
-from collections.abc import MutableMapping
+import functools
 
 from .param import Param
+from .utils import SlotsMapping
 
 
 LOG = logging.getLogger(__name__)
 
-# Regex pattern from p2p-sip project
-URI_PATTERN = re.compile('^(?P<scheme>[a-zA-Z][a-zA-Z0-9\+\-\.]*):'  # scheme
-                         + '(?:(?:(?P<user>[a-zA-Z0-9\-\_\.!\~\*\'\(\)&=\+\$,;\?\/\%]+)'  # user
-                         + '(?::(?P<password>[^:@;\?]+))?)@)?'  # password
-                         + '(?:(?:(?P<host>[^;\?:]*)(?::(?P<port>[\d]+))?))'  # host, port
-                         + '(?:;(?P<params>[^\?]*))?'  # parameters
-                         + '(?:\?(?P<headers>.*))?$')  # headers
-
+URI_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=URI_CACHE_SIZE)
+def parse_uri(uri):
+    """
+    Split ``uri`` in a single pass.
+
+    Return ``(scheme, user, password, host, port, params, headers)``. Results are
+    cached, the returned ``Param`` must be copied before use.
+    """
+    scheme, sep, rest = uri.partition(':')
+    if not sep or not scheme[:1].isalpha():
+        raise ValueError('Not valid uri')
+
+    user = password = None
+    at = rest.find('@')
+    if at >= 0:
+        user, _, password = rest[:at].partition(':')
+        if not user:
+            raise ValueError('Not valid uri')
+        password = password or None
+        rest = rest[at + 1:]
+
+    rest, sep, headers = rest.partition('?')
+    headers = headers if sep else None
+    rest, sep, params = rest.partition(';')
+    params = (Param(params) if params else params) if sep else None
+
+    if rest.startswith('['):  # IPv6 reference
+        end = rest.find(']') + 1
+        host, port = rest[:end], rest[end:]
+        if not end or port[:1] not in ('', ':'):
+            raise ValueError('Not valid uri')
+        port = port[1:]
+    else:
+        host, _, port = rest.partition(':')
+
+    if port:
+        if not port.isdigit():
+            raise ValueError('Not valid uri')
+        port = int(port)
+    else:
+        port = None
+
+    if host == 'localhost':
+        host = '127.0.0.1'
+
+    return scheme, user, password, host, port, params, headers
+
+
+class Uri(SlotsMapping):
+    __slots__ = ('scheme', 'user', 'password', 'host', 'port', 'params', 'headers')
+    _fields = __slots__
 
-class Uri(MutableMapping):
     def __init__(self, uri):
-        self._uri = URI_PATTERN.match(uri).groupdict()
-        if 'host' not in self._uri:
-            raise ValueError('host is a mandatory field')
-        elif self._uri['host'] == 'localhost':
-            self._uri['host'] = '127.0.0.1'
-
-        if self._uri['port']:
-            self._uri['port'] = int(self._uri['port'])
-        if self._uri['params']:
-            self._uri['params'] = Param(self._uri['params'])
+        self.scheme, self.user, self.password, self.host, self.port, params, self.headers = parse_uri(uri)
+        self.params = params.copy() if isinstance(params, Param) else params
+        self._extra = None
 
     def short_uri(self):
         r = ''
-        if self._uri['scheme']:
-            r += '%s:' % self._uri['scheme']
-        if self._uri['user']:
-            r += self._uri['user']
-            if self._uri['password']:
-                r += ':%s' % self._uri['password']
+        if self.scheme:
+            r += '%s:' % self.scheme
+        if self.user:
+            r += self.user
+            if self.password:
+                r += ':%s' % self.password
             r += '@'
-        if self._uri['host']:
-            r += self._uri['host']
+        if self.host:
+            r += self.host
         else:
             raise ValueError('host is a mandatory field')
-        if self._uri['port']:
-            r += ':%s' % self._uri['port']
+        if self.port:
+            r += ':%s' % self.port
         return r
 
     def optional_params(self):
         r = ''
-        if self._uri['params']:
-            r += ';%s' % self._uri['params']
-        if self._uri['headers']:
-            r += '?%s' % self._uri['headers']
+        if self.params:
+            r += ';%s' % self.params
+        if self.headers:
+            r += '?%s' % self.headers
         return r
 
+    def _state(self):
+        return (self.scheme, self.user, self.password, self.host, self.port,
+                self.params, getattr(self.params, '_version', None), self.headers)
+
     def contact_repr(self):
         return '<%s>' % str(self)
 
@@ -63,22 +103,3 @@ class Uri(MutableMapping):
         r = self.short_uri()
         r += self.optional_params()
         return r
-
-    # MutableMapping API
-    def __eq__(self, other):
-        return self is other
-
-    def __getitem__(self, key):
-        return self._uri[key]
-
-    def __setitem__(self, key, value):
-        self._uri[key] = value
-
-    def __delitem__(self, key):
-        del self._uri[key]
-
-    def __len__(self):
-        return len(self._uri)
-
-    def __iter__(self):
-        return iter(self._uri)
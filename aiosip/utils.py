@@ -4,6 +4,8 @@ import asyncio
 import logging
 import ipaddress
 
+from collections.abc import MutableMapping
+
 
 LOG = logging.getLogger(__name__)
 
@@ -141,3 +143,48 @@ def _callback(f):
         pass
     except Exception as e:
         LOG.exception(e)
+
+
+class SlotsMapping(MutableMapping):
+    """
+    Mapping interface over the slots listed in ``_fields``.
+
+    Keys outside of ``_fields`` are stored in a dict only created when needed.
+    """
+    __slots__ = ('_extra',)
+    _fields = ()
+
+    # MutableMapping API
+    def __eq__(self, other):
+        return self is other
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        elif self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            setattr(self, key, None)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __len__(self):
+        return len(self._fields) + (len(self._extra) if self._extra else 0)
+
+    def __iter__(self):
+        yield from self._fields
+        if self._extra:
+            yield from self._extra
@@ -1,58 +1,204 @@
-import re
 import logging
 
-from collections.abc import MutableMapping
+from collections.abc import Sequence
 
 from .param import Param
+from .utils import SlotsMapping, format_host_and_port
 
 
-VIA_PATTERNS = [
-    re.compile('SIP/2.0/(?P<protocol>[a-zA-Z]+)'
-               '[ \t]*'
-               '(?P<sentby>[^;]+)'
-               '(?:;(?P<params>.*))'),
-]
+LOG = logging.getLogger(__name__)
 
 
-LOG = logging.getLogger(__name__)
+def split_host_and_port(sentby):
+    if sentby.startswith('['):  # IPv6 reference
+        end = sentby.find(']') + 1
+        host, port = sentby[:end], sentby[end + 1:]
+    else:
+        host, _, port = sentby.partition(':')
 
+    if port:
+        if not port.isdigit():
+            raise ValueError('Not valid via address')
+        return host, int(port)
+    return host, None
+
+
+def split_header(header):
+    """
+    Split a Via header value on the commas separating its values.
+    """
+    values = []
+    start = 0
+    quoted = False
+    for i, c in enumerate(header):
+        if c == '"':
+            quoted = not quoted
+        elif c == ',' and not quoted:
+            values.append(header[start:i])
+            start = i + 1
+    values.append(header[start:])
+    return [value.strip() for value in values if value.strip()]
+
+
+class Via(SlotsMapping):
+    __slots__ = ('protocol', 'host', 'port', 'params')
+    _fields = ('protocol', 'sentby', 'params', 'host', 'port')
 
-class Via(MutableMapping):
     def __init__(self, *args, **kwargs):
-        self._via = dict(*args, **kwargs)
+        via = dict(*args, **kwargs)
+        self.protocol = via.pop('protocol', None)
+
+        sentby = via.pop('sentby', None)
+        if sentby:
+            self.host, self.port = split_host_and_port(sentby)
+            via.pop('host', None)
+            via.pop('port', None)
+        else:
+            self.host = via.pop('host')
+            self.port = via.pop('port', None)
 
-        params = self._via.get('params')
-        if not params:
-            self._via['params'] = Param()
-        if not isinstance(params, Param):
-            self._via['params'] = Param(self._via['params'])
+        params = via.pop('params', None)
+        self.params = params if isinstance(params, Param) else Param(params or '')
 
-        self._via['host'], self._via['port'] = self._via['sentby'].rsplit(':', 1)
+        self._extra = via or None
 
     @classmethod
     def from_header(cls, via):
-        for s in VIA_PATTERNS:
-            m = s.match(via)
-            if m:
-                return cls(m.groupdict())
-        else:
+        version, _, rest = via.strip().partition(' ')
+        if version[:8].upper() != 'SIP/2.0/' or not version[8:]:
+            raise ValueError('Not valid via address')
+
+        sentby, _, params = rest.partition(';')
+        sentby = sentby.strip()
+        if not sentby:
             raise ValueError('Not valid via address')
 
-    # MutableMapping API
-    def __eq__(self, other):
-        return self is other
+        return cls(protocol=version[8:], sentby=sentby, params=params)
+
+    @property
+    def sentby(self):
+        return format_host_and_port(self.host, self.port)
+
+    @sentby.setter
+    def sentby(self, sentby):
+        self.host, self.port = split_host_and_port(sentby)
+
+    @property
+    def branch(self):
+        return self.params.get('branch')
+
+    @property
+    def received(self):
+        return self.params.get('received')
+
+    @property
+    def rport(self):
+        """
+        Port of the rport parameter, True when it was requested but not yet filled.
+        """
+        if 'rport' not in self.params:
+            return None
+        rport = self.params['rport']
+        return int(rport) if rport else True
+
+    def response_addr(self, source=None):
+        """
+        Address responses are sent to, following RFC 3261 18.2.2 and RFC 3581.
+
+        ``source`` is the address the request was received from, if known.
+        """
+        rport = self.rport
+        if rport is True and source is not None:
+            return source
+        elif rport and rport is not True:
+            port = rport
+        elif self.port:
+            port = self.port
+        else:
+            port = 5061 if (self.protocol or '').upper() == 'TLS' else 5060
+        return self.received or self.host, port
+
+    def _state(self):
+        return self.protocol, self.host, self.port, self.params, self.params._version
+
+    def __str__(self):
+        r = 'SIP/2.0/%s %s' % (self.protocol, self.sentby)
+        if self.params:
+            r += ';%s' % self.params
+        return r
+
 
-    def __getitem__(self, key):
-        return self._via[key]
+class ViaStack(Sequence):
+    """
+    Via headers of a message, top most first.
 
-    def __setitem__(self, key, value):
-        self._via[key] = value
+    The top Via is parsed on creation since transaction matching and response
+    routing only need its branch, sent-by and rport. The others are parsed on
+    first access.
+    """
+    __slots__ = ('top', '_vias', '_raw')
 
-    def __delitem__(self, key):
-        del self._via[key]
+    def __init__(self, header):
+        if isinstance(header, (str, Via)):
+            header = [header]
+
+        first, *raw = header
+        if isinstance(first, Via):
+            self.top = first
+        else:
+            first, *rest = split_header(first)
+            self.top = Via.from_header(first)
+            raw[:0] = rest
+
+        self._raw = raw
+        self._vias = None
+
+    @property
+    def branch(self):
+        return self.top.branch
+
+    @property
+    def sentby(self):
+        return self.top.host, self.top.port
+
+    @property
+    def rport(self):
+        return self.top.rport
+
+    def _parse(self):
+        if self._vias is None:
+            self._vias = [self.top]
+            for value in self._raw:
+                if isinstance(value, Via):
+                    self._vias.append(value)
+                else:
+                    self._vias.extend(Via.from_header(v) for v in split_header(value))
+            self._raw = None
+        return self._vias
+
+    def values(self):
+        """
+        Header values of the stack, untouched Vias are kept as received.
+        """
+        if self._vias is None:
+            return [str(self.top)] + [str(value) for value in self._raw]
+        return [str(via) for via in self._vias]
+
+    def _state(self):
+        if self._vias is None:
+            return self, self.top._state()
+        return (self, ) + tuple(via._state() for via in self._vias)
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.top
+        return self._parse()[index]
 
     def __len__(self):
-        return len(self._via)
+        return len(self._parse())
 
     def __iter__(self):
-        return iter(self._via)
+        return iter(self._parse())
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(self.__class__.__name__, self.values())
@@ -0,0 +1,62 @@
+"""
+Measure the memory held by idle dialogs.
+
+Usage: python benchmarks/dialog_memory.py [number of dialogs]
+"""
+import gc
+import sys
+import asyncio
+import tracemalloc
+
+import aiosip
+from aiosip.peers import Peer
+
+
+class Transport:
+    def get_extra_info(self, key):
+        return '127.0.0.1', 5060
+
+
+class Protocol:
+    via = 'UDP'
+    transport = Transport()
+
+
+def create_dialogs(app, peer, count):
+    dialogs = []
+    for i in range(count):
+        dialog = peer._create_dialog(
+            method='SUBSCRIBE',
+            from_details=aiosip.Contact.from_header('"Alice" <sip:alice@example.com:5060>'),
+            to_details=aiosip.Contact.from_header('<sip:{}@example.com:5060>'.format(i)),
+            headers={'Expires': 1800},
+        )
+        dialog.original_msg.encode()
+        dialogs.append(dialog)
+    return dialogs
+
+
+def main(count=10000):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    app = aiosip.Application(loop=loop)
+    peer = Peer(('127.0.0.1', 5060), app, loop=loop)
+    peer._connected(Protocol())
+
+    create_dialogs(app, peer, 100)  # warm up caches
+    app._dialogs.clear()
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    dialogs = create_dialogs(app, peer, count)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('{} dialogs: {:.0f} bytes per dialog'.format(len(dialogs), (after - before) / count))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
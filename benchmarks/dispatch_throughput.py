@@ -0,0 +1,61 @@
+"""
+Compare the throughput of dispatching messages in a task per message with the
+per Call-ID serial executor.
+
+Usage: python benchmarks/dispatch_throughput.py [number of messages] [number of Call-IDs]
+"""
+import sys
+import time
+import asyncio
+
+from aiosip.executor import SerialExecutor
+
+
+async def handle(i):
+    # Stand-in for a dispatch: yield to the loop once, like Dialog.receive_message
+    await asyncio.sleep(0)
+    return i
+
+
+async def run(submit, count, calls):
+    done = asyncio.get_event_loop().create_future()
+    remaining = count
+
+    # Completion is tracked with a callback, like the in flight accounting of Application
+    def callback(_):
+        nonlocal remaining
+        remaining -= 1
+        if not remaining:
+            done.set_result(None)
+
+    for i in range(count):
+        submit(i % calls, handle(i)).add_done_callback(callback)
+    await done
+
+
+async def tasks(count, calls):
+    await run(lambda key, coro: asyncio.ensure_future(coro), count, calls)
+
+
+async def serial(count, calls):
+    await run(SerialExecutor().submit, count, calls)
+
+
+def measure(loop, func, count, calls):
+    start = time.perf_counter()
+    loop.run_until_complete(func(count, calls))
+    return count / (time.perf_counter() - start)
+
+
+def main(count=100000, calls=1000):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    for func in (tasks, serial):
+        measure(loop, func, count // 10, calls)  # warm up
+        rate = measure(loop, func, count, calls)
+        print('{:>6}: {:.0f} messages/s over {} Call-IDs'.format(func.__name__, rate, calls))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -11,7 +11,7 @@ readme = open('README.rst').read()
 history = open('HISTORY.rst').read().replace('.. :changelog:', '')
 
 requirements = [
-   'multidict>=2.0',
+   'multidict>=4.0',
    'pyquery',
    'aiodns',
    'websockets',
@@ -6,6 +6,46 @@ import itertools
 pytest_plugins = ['aiosip.pytest_plugin']
 
 
+OPTIONS = (
+    'OPTIONS sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+    'Via: SIP/2.0/UDP 127.0.0.1:{port};branch=z9hG4bK{branch};rport\r\n'
+    'Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK1234abcdef\r\n'
+    'From: <sip:pytest@127.0.0.1:{port}>;tag=a1b2c3\r\n'
+    'To: <sip:666@127.0.0.1:6000>\r\n'
+    'Call-ID: {call_id}\r\n'
+    'CSeq: 1 OPTIONS\r\n'
+    'Contact: <sip:pytest@127.0.0.1:{port}>\r\n'
+    'Content-Length: 0\r\n'
+    '\r\n'
+)
+
+
+def options_request(port, call_id='5f4b3c2d-1e0f', branch='abcdef1234'):
+    return OPTIONS.format(port=port, call_id=call_id, branch=branch).encode()
+
+
+class UDPClient(asyncio.DatagramProtocol):
+    """Raw datagram peer sending hand written requests to a test server"""
+    def __init__(self):
+        self.transport = None
+        self.responses = asyncio.Queue()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.responses.put_nowait(aiosip.Message.from_raw(data))
+
+    def request(self, **kwargs):
+        return options_request(self.transport.get_extra_info('sockname')[1], **kwargs)
+
+    def send(self, request=None, **kwargs):
+        self.transport.sendto(request or self.request(**kwargs))
+
+    def receive(self, timeout=1):
+        return asyncio.wait_for(self.responses.get(), timeout=timeout)
+
+
 class TestServer:
     def __init__(self, app, *, loop=None, host='127.0.0.1'):
         self.loop = loop
@@ -97,6 +137,28 @@ def test_proxy(protocol, loop):
     loop.run_until_complete(finalize())
 
 
+@pytest.fixture
+def raw_options():
+    return options_request
+
+
+@pytest.yield_fixture
+def udp_client(loop):
+    transports = []
+
+    @asyncio.coroutine
+    def go(server):
+        transport, client = yield from loop.create_datagram_endpoint(
+            UDPClient, remote_addr=(server.sip_config['server_host'], server.sip_config['server_port']))
+        transports.append(transport)
+        return client
+
+    yield go
+
+    while transports:
+        transports.pop().close()
+
+
 @pytest.fixture
 def from_details(request):
     return 'sip:{user}@{host}:{port}'.format(
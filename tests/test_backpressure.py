@@ -0,0 +1,234 @@
+import asyncio
+
+import aiosip
+import pytest
+
+
+def blocking_dialplan(release):
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+            # Messages are in flight until they are dispatched to their route
+            await release
+            return self.on_subscribe
+
+        async def on_subscribe(self, request, message):
+            await request.prepare(status_code=200)
+
+    return Dialplan()
+
+
+async def wait_inflight(app, count):
+    while app.inflight != count:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+async def test_udp_overload_503(test_server, protocol, loop, from_details, to_details):
+    release = loop.create_future()
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=blocking_dialplan(release),
+                                    defaults={'max_inflight': 1, 'overload_policy': '503'})
+    server = await test_server(server_app)
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+
+    first = asyncio.ensure_future(peer.subscribe(
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+    ))
+    await asyncio.wait_for(wait_inflight(server_app, 1), timeout=1)
+
+    second = await peer.subscribe(
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+    )
+    assert second.status_code == 503
+    assert server_app.dropped == 1
+
+    release.set_result(None)
+    first = await first
+    assert first.status_code == 200
+
+    await app.close()
+    await server_app.close()
+
+
+@pytest.mark.parametrize('protocol', [aiosip.TCP])
+async def test_tcp_pause_reading(test_server, protocol, loop, from_details, to_details):
+    release = loop.create_future()
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=blocking_dialplan(release),
+                                    defaults={'max_inflight_per_transport': 1})
+    server = await test_server(server_app)
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+
+    def subscribe():
+        return asyncio.ensure_future(peer.subscribe(
+            from_details=aiosip.Contact.from_header(from_details),
+            to_details=aiosip.Contact.from_header(to_details),
+        ))
+
+    subscriptions = [subscribe()]
+    await asyncio.wait_for(wait_inflight(server_app, 1), timeout=1)
+    subscriptions.append(subscribe())
+    await asyncio.sleep(0.1)
+
+    # The second request stays in the socket buffer until the first is handled
+    assert server_app.inflight == 1
+    assert len(server_app._paused) == 1
+
+    release.set_result(None)
+    for subscription in await asyncio.gather(*subscriptions):
+        assert subscription.status_code == 200
+    assert not server_app._paused
+
+    await app.close()
+    await server_app.close()
+
+
+OPTIONS = (
+    'OPTIONS sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+    'Via: SIP/2.0/TCP 127.0.0.1:7000;branch=z9hG4bK{i}\r\n'
+    'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+    'To: <sip:666@127.0.0.1:6000>\r\n'
+    'Call-ID: pipelined-{i}\r\n'
+    'CSeq: 1 OPTIONS\r\n'
+    'Content-Length: 0\r\n'
+    '\r\n'
+)
+
+
+@pytest.mark.parametrize('protocol', [aiosip.TCP])
+async def test_tcp_pipelined_burst(test_server, protocol, loop):
+    release = loop.create_future()
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+            await release
+            return self.on_options
+
+        async def on_options(self, request, message):
+            await request.reply(200)
+
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan(), defaults={'max_inflight_per_transport': 2})
+    server = await test_server(server_app)
+
+    reader, writer = await asyncio.open_connection(server.sip_config['server_host'], server.sip_config['server_port'])
+    writer.write(''.join(OPTIONS.format(i=i) for i in range(5)).encode())
+    await asyncio.wait_for(wait_inflight(server_app, 2), timeout=1)
+    await asyncio.sleep(0.1)
+
+    # The burst arrived in a single read, only the first messages are dispatched
+    assert server_app.inflight == 2
+    assert len(server_app._paused) == 1
+
+    release.set_result(None)
+    responses = []
+    while len(responses) < 5:
+        responses.append(aiosip.Message.from_raw_headers(await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 1)))
+    assert sorted(response.headers['Call-ID'] for response in responses) == ['pipelined-{}'.format(i) for i in range(5)]
+    assert all(response.status_code == 200 for response in responses)
+    assert not server_app._paused
+
+    writer.close()
+    await server_app.close()
+
+
+class Protocol:
+    inflight = 0
+
+
+async def test_close_drops_queued_messages(loop):
+    app = aiosip.Application(loop=loop, defaults={'dispatch_limit': 1})
+    transport = Protocol()
+
+    response = aiosip.Message.from_raw(
+        b'SIP/2.0 200 OK\r\n'
+        b'Via: SIP/2.0/UDP 127.0.0.1:6000;branch=z9hG4bKstale\r\n'
+        b'From: <sip:pytest@127.0.0.1:6000>;tag=a1b2c3\r\n'
+        b'To: <sip:666@127.0.0.1:7000>;tag=d4e5f6\r\n'
+        b'Call-ID: stale\r\n'
+        b'CSeq: 1 OPTIONS\r\n'
+        b'Content-Length: 0\r\n'
+        b'\r\n'
+    )
+    app._dispatch_later(transport, response, None)
+    for i in range(3):
+        app._dispatch_later(transport, aiosip.Message.from_raw(OPTIONS.format(i=i).encode()), None)
+    assert app.inflight == 4
+    assert len(app._scheduler) == 3
+
+    await app.close()
+    assert len(app._scheduler) == 0
+    assert not app._held
+    assert app.inflight == transport.inflight == 1
+
+    await asyncio.sleep(0.01)
+    assert app.inflight == transport.inflight == 0
+
+
+async def test_dialog_route_at_limit(test_server, protocol, loop, from_details, to_details):
+    unsubscribed = loop.create_future()
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+            return self.on_subscribe
+
+        async def on_subscribe(self, request, message):
+            dialog = await request.prepare(status_code=200, headers={'Expires': message.headers['Expires']})
+            async for message in dialog:
+                await dialog.reply(message, status_code=200, headers={'Expires': message.headers['Expires']})
+                if message.headers['Expires'] == '0':
+                    unsubscribed.set_result(None)
+
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan(),
+                                    defaults={'max_inflight': 1, 'max_inflight_per_transport': 1})
+    server = await test_server(server_app)
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+
+    dialog = await peer.subscribe(
+        expires=1800,
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+    )
+    await asyncio.wait_for(wait_inflight(server_app, 0), timeout=1)
+
+    # The route lives as long as the dialog, its in-dialog requests are still read
+    assert server_app.tasks == 1
+    assert not server_app._paused
+    await asyncio.wait_for(dialog.close(), timeout=2)
+    await asyncio.wait_for(unsubscribed, timeout=1)
+
+    await app.close()
+    await server_app.close()
+
+
+async def test_malformed_messages_not_counted(loop):
+    app = aiosip.Application(loop=loop, defaults={'max_inflight': 2, 'dispatch_limit': 10})
+    transport = Protocol()
+
+    for i in range(3):
+        msg = aiosip.Message.from_raw(OPTIONS.format(i=i).replace('Call-ID: pipelined-{}\r\n'.format(i), '').encode())
+        app._dispatch_later(transport, msg, None)
+    msg = aiosip.Message.from_raw(OPTIONS.format(i=3).replace('To: <sip:666@127.0.0.1:6000>', 'To: <>').encode())
+    app._dispatch_later(transport, msg, None)
+
+    assert app.inflight == transport.inflight == 0
+    assert not app._over_limit(transport)
+    assert not app._held
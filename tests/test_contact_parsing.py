@@ -1,4 +1,5 @@
 import aiosip
+import pytest
 
 
 def test_simple_header():
@@ -80,3 +81,58 @@ def test_add_tag():
 
     header.add_tag()
     assert 'tag' in header['params']
+
+
+def test_slotted_mapping_compatibility():
+    header = aiosip.Contact.from_header('"Pytest" <sip:pytest@127.0.0.1:7000>;tag=a48s')
+    assert not hasattr(header, '__dict__')
+    assert header.uri is header['uri']
+    assert header.uri.port == 7000
+    assert header.params['tag'] == 'a48s'
+
+    header['uri']['port'] = 7001
+    header['expires'] = 3600
+    assert header['expires'] == 3600
+    assert list(header) == ['name', 'uri', 'params', 'expires']
+    assert str(header) == '"Pytest" <sip:pytest@127.0.0.1:7001>;tag=a48s'
+
+    del header['expires']
+    del header['params']['tag']
+    assert list(header) == ['name', 'uri', 'params']
+    assert str(header) == '"Pytest" <sip:pytest@127.0.0.1:7001>'
+
+
+def test_header_with_unquoted_multi_word_name():
+    header = aiosip.Contact.from_header('John Doe <sip:john@example.com;transport=tcp>;expires=60')
+    assert header['name'] == 'John Doe'
+    assert dict(header['params']) == {'expires': '60'}
+    assert dict(header['uri']['params']) == {'transport': 'tcp'}
+    assert header.transport == 'udp'
+    assert str(header) == '"John Doe" <sip:john@example.com;transport=tcp>;expires=60'
+
+
+def test_parsed_headers_are_copy_on_write():
+    raw = '"Pytest" <sip:pytest@127.0.0.1:7000;transport=udp>;tag=a48s'
+    first = aiosip.Contact.from_header(raw)
+    second = aiosip.Contact.from_header(raw)
+    assert first is not second
+    assert first['params'] is not second['params']
+
+    first['params']['tag'] = 'changed'
+    first['uri']['params']['transport'] = 'tcp'
+    first['uri']['port'] = 7001
+    assert str(first) == '"Pytest" <sip:pytest@127.0.0.1:7001;transport=tcp>;tag=changed'
+    assert str(second) == raw
+    assert str(aiosip.Contact.from_header(raw)) == raw
+
+
+@pytest.mark.parametrize('header', [
+    '',
+    '"Unterminated <sip:pytest@127.0.0.1>',
+    '<sip:pytest@127.0.0.1',
+    '<sip:pytest@127.0.0.1> garbage',
+    '<127.0.0.1>',
+])
+def test_invalid_header(header):
+    with pytest.raises(ValueError):
+        aiosip.Contact.from_header(header)
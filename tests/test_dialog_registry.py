@@ -0,0 +1,115 @@
+import aiosip
+
+from aiosip.dialog import DialogRegistry
+
+
+class Dialog:
+    def __init__(self, call_id, local, remote):
+        self.call_id = call_id
+        self.from_details = aiosip.Contact.from_header(local)
+        self.to_details = aiosip.Contact.from_header(remote)
+
+
+def message(from_header, to_header, call_id, status_code=None):
+    request = aiosip.Request(
+        method='NOTIFY',
+        cseq=1,
+        from_details=aiosip.Contact.from_header(from_header),
+        to_details=aiosip.Contact.from_header(to_header),
+        contact_details=aiosip.Contact.from_header(from_header),
+        headers={'Call-ID': call_id},
+    )
+    if status_code is None:
+        return request
+    return aiosip.Response.from_request(request, status_code, 'OK', headers={'Call-ID': call_id})
+
+
+def test_client_dialog():
+    registry = DialogRegistry()
+    dialog = Dialog('abc', '<sip:a@127.0.0.1>;tag=local', '<sip:b@127.0.0.1>')
+    registry.add(dialog)
+    assert len(registry) == 1
+
+    # Responses before and after the remote tag is known
+    response = message('<sip:a@127.0.0.1>;tag=local', '<sip:b@127.0.0.1>;tag=remote', 'abc', 200)
+    assert registry.match(response) is dialog
+
+    registry.remove(dialog)
+    dialog.to_details['params']['tag'] = 'remote'
+    registry.add(dialog, alias=False)
+    assert registry.match(response) is dialog
+    assert registry.match(message('<sip:b@127.0.0.1>;tag=remote', '<sip:a@127.0.0.1>;tag=local', 'abc')) is dialog
+    assert registry.match(message('<sip:b@127.0.0.1>;tag=remote', '<sip:a@127.0.0.1>', 'abc')) is None
+    assert registry.match(message('<sip:b@127.0.0.1>;tag=remote', '<sip:a@127.0.0.1>;tag=local', 'xyz')) is None
+
+
+def test_server_dialog_alias():
+    registry = DialogRegistry()
+    dialog = Dialog('abc', '<sip:b@127.0.0.1>;tag=local', '<sip:a@127.0.0.1>;tag=remote')
+    registry.add(dialog)
+
+    early = message('<sip:a@127.0.0.1>;tag=remote', '<sip:b@127.0.0.1>', 'abc')
+    assert registry.match(early) is dialog
+
+    registry.discard_alias(dialog)
+    assert registry.match(early) is None
+    assert registry.match(message('<sip:a@127.0.0.1>;tag=remote', '<sip:b@127.0.0.1>;tag=local', 'abc')) is dialog
+
+
+def test_remove_all_keys():
+    registry = DialogRegistry()
+    first = Dialog('abc', '<sip:b@127.0.0.1>;tag=one', '<sip:a@127.0.0.1>;tag=remote')
+    second = Dialog('abc', '<sip:b@127.0.0.1>;tag=two', '<sip:a@127.0.0.1>;tag=other')
+    registry.add(first)
+    registry.add(second)
+    assert len(registry) == 2
+    assert registry.calls == 1
+
+    registry.remove(first)
+    registry.remove(first)
+    assert list(registry) == [second]
+    assert registry._calls['abc'] == {('two', 'other'): second, (None, 'other'): second}
+
+    registry.remove(second)
+    assert not registry
+    assert registry.calls == 0
+    assert not registry._calls
+
+
+async def test_dialogs_removed_on_close(test_server, protocol, loop, from_details, to_details):
+    subscribed = loop.create_future()
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+            return self.subscribe
+
+        async def subscribe(self, request, msg):
+            dialog = await request.prepare(status_code=200, headers={'Expires': msg.headers['Expires']})
+            subscribed.set_result(dialog)
+            async for msg in dialog:
+                await dialog.reply(msg, status_code=200, headers={'Expires': msg.headers['Expires']})
+
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan())
+    server = await test_server(server_app)
+
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+    await peer.subscribe(
+        expires=1800,
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+    )
+    await subscribed
+    assert len(app._dialogs) == 1 and app._dialogs.calls == 1
+    assert len(server_app._dialogs) == 1 and server_app._dialogs.calls == 1
+
+    await app.close()
+    await server_app.close()
+
+    assert not app._dialogs and not app._dialogs.calls
+    assert not server_app._dialogs and not server_app._dialogs.calls
@@ -0,0 +1,97 @@
+import aiosip
+import pytest
+
+from aiosip.protocol import UDP, TCP
+
+
+def request(method, uri):
+    return aiosip.Message.from_raw(
+        '{method} {uri} SIP/2.0\r\n'
+        'Via: SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234\r\n'
+        'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+        'To: <{uri}>\r\n'
+        'Call-ID: 5f4b3c2d-1e0f\r\n'
+        'CSeq: 1 {method}\r\n'
+        'Content-Length: 0\r\n'
+        '\r\n'.format(method=method, uri=uri).encode()
+    )
+
+
+async def resolve(dialplan, method, uri, protocol=UDP, local_addr=('127.0.0.1', 6000)):
+    return await dialplan.resolve(
+        method=method,
+        message=request(method, uri),
+        protocol=protocol,
+        local_addr=local_addr,
+        remote_addr=('127.0.0.1', 7000),
+    )
+
+
+async def test_routing_dialplan(loop):
+    options = aiosip.StatelessReply(200)
+    dialplan = aiosip.RoutingDialplan(default='default')
+    dialplan.add_route('any-user')
+    dialplan.add_route('alice', user='alice')
+    dialplan.add_route('france', user='33*')
+    dialplan.add_route('paris', user='331*')
+    dialplan.add_route('invite', method='invite', user='33*')
+    dialplan.add_route('tcp', method='INVITE', protocol=TCP)
+    dialplan.add_route(options, method='OPTIONS', host='example.com')
+
+    assert await resolve(dialplan, 'MESSAGE', 'sip:alice@example.com') == 'alice'
+    assert await resolve(dialplan, 'MESSAGE', 'sip:33612345678@example.com') == 'france'
+    assert await resolve(dialplan, 'MESSAGE', 'sip:33145678901@example.com') == 'paris'
+    assert await resolve(dialplan, 'MESSAGE', 'sip:bob@example.com') == 'any-user'
+    assert await resolve(dialplan, 'MESSAGE', 'sip:example.com') == 'any-user'
+    assert await resolve(dialplan, 'INVITE', 'sip:33145678901@example.com') == 'invite'
+    assert await resolve(dialplan, 'INVITE', 'sip:33145678901@example.com', protocol=TCP) == 'tcp'
+    assert await resolve(dialplan, 'INVITE', 'sip:bob@example.com') == 'any-user'
+    assert await resolve(dialplan, 'OPTIONS', 'sip:example.com') is options
+    assert await resolve(dialplan, 'OPTIONS', 'sip:example.org') == 'any-user'
+
+
+async def test_routing_dialplan_cache(loop):
+    dialplan = aiosip.RoutingDialplan(cache_size=2)
+    assert await resolve(dialplan, 'MESSAGE', 'sip:alice@example.com') is None
+
+    dialplan.add_route('alice', user='alice', local_addr=('127.0.0.1', 6000))
+    assert await resolve(dialplan, 'MESSAGE', 'sip:alice@example.com') == 'alice'
+    assert await resolve(dialplan, 'MESSAGE', 'sip:alice@example.com', local_addr=('127.0.0.1', 6001)) is None
+    assert len(dialplan._cache) == 2
+
+    await resolve(dialplan, 'MESSAGE', 'sip:bob@example.com')
+    assert len(dialplan._cache) == 1
+
+
+def test_duplicate_route():
+    dialplan = aiosip.RoutingDialplan()
+    dialplan.add_route('first', user='33*')
+    dialplan.add_route('second', user='33*')
+    with pytest.raises(ValueError):
+        dialplan._compile()
+
+
+async def test_routing_dialplan_transport(test_server, protocol, loop, from_details, to_details):
+    async def on_message(request, message):
+        await request.reply(202)
+
+    dialplan = aiosip.RoutingDialplan(default=aiosip.StatelessReply(403))
+    dialplan.add_route(on_message, method='MESSAGE', protocol=TCP)
+
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=dialplan)
+    server = await test_server(server_app)
+
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+    response = await peer.send_request(
+        'MESSAGE',
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+    )
+    assert response.status_code == (202 if protocol is TCP else 403)
+
+    await app.close()
+    await server_app.close()
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from aiosip.executor import SerialExecutor, TaskRegistry, PriorityScheduler
+
+
+async def test_same_key_in_order(loop):
+    executor = SerialExecutor(loop=loop)
+    order = []
+
+    async def work(i, delay):
+        await asyncio.sleep(delay)
+        order.append(i)
+        return i
+
+    futures = [executor.submit('call-id', work(i, delay)) for i, delay in enumerate((0.03, 0.01, 0))]
+    assert executor.pending('call-id') == 3
+
+    assert await asyncio.gather(*futures) == [0, 1, 2]
+    assert order == [0, 1, 2]
+    assert executor.pending('call-id') == 0
+    assert len(executor) == 0
+
+
+async def test_keys_run_concurrently(loop):
+    executor = SerialExecutor(loop=loop)
+    release = loop.create_future()
+
+    async def blocked():
+        await release
+
+    async def work():
+        return 'done'
+
+    blocked_future = executor.submit('first', blocked())
+    assert await asyncio.wait_for(executor.submit('second', work()), timeout=1) == 'done'
+    assert not blocked_future.done()
+
+    release.set_result(None)
+    await blocked_future
+
+
+async def test_exception_does_not_stop_key(loop):
+    executor = SerialExecutor(loop=loop)
+
+    async def fail():
+        raise RuntimeError('boom')
+
+    async def work():
+        return 'done'
+
+    failed = executor.submit('call-id', fail())
+    done = executor.submit('call-id', work())
+
+    with pytest.raises(RuntimeError):
+        await failed
+    assert await done == 'done'
+
+
+async def test_task_registry(loop):
+    registry = TaskRegistry(limit=2, loop=loop)
+    registry.limits['unlimited'] = None
+    release = loop.create_future()
+
+    async def work():
+        await release
+
+    tasks = [registry.start(work(), key='route') for _ in range(3)]
+    assert tasks[2] is None
+    assert registry.full('route')
+    assert registry.active('route') == 2
+
+    for _ in range(3):
+        assert registry.start(work(), key='unlimited')
+    assert len(registry) == 5
+
+    release.set_result(None)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert len(registry) == 0
+    assert registry.active('route') == 0
+    assert not registry._active
+
+
+async def test_task_registry_cancel(loop):
+    registry = TaskRegistry(loop=loop)
+    tasks = [registry.start(asyncio.sleep(10)) for _ in range(3)]
+
+    registry.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(task.cancelled() for task in tasks)
+    assert len(registry) == 0
+
+
+def test_priority_scheduler():
+    scheduler = PriorityScheduler(weights=(2, 1), limit=1)
+    started = []
+
+    scheduler.submit(1, started.append, 'initial-1')
+    for i in range(3):
+        scheduler.submit(1, started.append, 'initial-{}'.format(i + 2))
+    for i in range(4):
+        scheduler.submit(0, started.append, 'dialog-{}'.format(i + 1))
+    assert started == ['initial-1']
+    assert scheduler.pending(0) == 4
+    assert len(scheduler) == 7
+
+    while len(scheduler):
+        scheduler.done()
+    assert started == ['initial-1', 'dialog-1', 'dialog-2', 'initial-2', 'dialog-3', 'dialog-4', 'initial-3',
+                       'initial-4']
+    assert scheduler.active == 1
+
+
+def test_priority_scheduler_unlimited():
+    scheduler = PriorityScheduler()
+    started = []
+
+    scheduler.submit(1, started.append, 'initial')
+    scheduler.submit(0, started.append, 'dialog')
+    assert started == ['initial', 'dialog']
+    assert scheduler.active == 2
+    assert len(scheduler) == 0
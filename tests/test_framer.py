@@ -0,0 +1,117 @@
+import aiosip
+import pytest
+
+from aiosip.framer import StreamFramer
+from aiosip.protocol import TCP
+
+
+OPTIONS = (
+    b'OPTIONS sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+    b'Via: SIP/2.0/TCP 127.0.0.1:7000;branch=z9hG4bKabcdef1234\r\n'
+    b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+    b'To: <sip:666@127.0.0.1:6000>\r\n'
+    b'Call-ID: 5f4b3c2d-1e0f\r\n'
+    b'CSeq: 1 OPTIONS\r\n'
+    b'Content-Length: 0\r\n'
+    b'\r\n'
+)
+
+MESSAGE = (
+    b'MESSAGE sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+    b'Via: SIP/2.0/TCP 127.0.0.1:7000;branch=z9hG4bK1234abcdef\r\n'
+    b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+    b'To: <sip:666@127.0.0.1:6000>\r\n'
+    b'Call-ID: 5f4b3c2d-1e0f\r\n'
+    b'CSeq: 2 MESSAGE\r\n'
+    b'Content-Type: text/plain\r\n'
+    b'Content-Length: 11\r\n'
+    b'\r\n'
+    b'hello world'
+)
+
+
+def test_pipelined_messages():
+    framer = StreamFramer()
+    messages = list(framer.feed(OPTIONS + MESSAGE + OPTIONS))
+    assert [msg.method for msg in messages] == ['OPTIONS', 'MESSAGE', 'OPTIONS']
+    assert messages[1].payload == 'hello world'
+    assert len(framer) == 0
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_chunked_messages(size):
+    framer = StreamFramer()
+    data = OPTIONS + MESSAGE
+    messages = []
+    for i in range(0, len(data), size):
+        messages.extend(framer.feed(data[i:i + size]))
+
+    assert [msg.method for msg in messages] == ['OPTIONS', 'MESSAGE']
+    assert messages[1].payload == 'hello world'
+    assert len(framer) == 0
+
+
+def test_partial_body():
+    framer = StreamFramer()
+    assert list(framer.feed(MESSAGE[:-5])) == []
+    messages = list(framer.feed(MESSAGE[-5:]))
+    assert len(messages) == 1
+    assert messages[0].payload == 'hello world'
+
+
+def test_keepalives():
+    # RFC 5626 - 4.4.1
+    framer = StreamFramer()
+    assert list(framer.feed(b'\r\n\r\n')) == []
+    assert list(framer.feed(b'\r\n')) == []
+    messages = list(framer.feed(b'\r\n\r\n' + OPTIONS + b'\r\n\r\n'))
+    assert [msg.method for msg in messages] == ['OPTIONS']
+    assert len(framer) == 0
+
+
+def test_headers_too_large():
+    framer = StreamFramer(max_headers_size=64)
+    with pytest.raises(ValueError):
+        list(framer.feed(OPTIONS))
+
+    framer = StreamFramer(max_headers_size=64)
+    with pytest.raises(ValueError):
+        list(framer.feed(b'OPTIONS sip:666@127.0.0.1:6000 SIP/2.0\r\n' + b'X' * 64))
+
+
+def test_body_too_large():
+    framer = StreamFramer(max_body_size=10)
+    with pytest.raises(ValueError):
+        list(framer.feed(MESSAGE[:-11]))
+
+
+@pytest.mark.parametrize('data', [
+    OPTIONS.replace(b'CSeq: 1 OPTIONS\r\n', b''),
+    OPTIONS.replace(b'CSeq: 1 OPTIONS', b'CSeq: '),
+    OPTIONS.replace(b'Content-Length: 0', b'Content-Length: -5'),
+    OPTIONS.replace(b'Content-Length: 0', b'Content-Length: five'),
+])
+def test_invalid_message(data):
+    framer = StreamFramer()
+    with pytest.raises(ValueError):
+        list(framer.feed(data))
+
+
+class Transport:
+    closed = False
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 7000)
+
+    def close(self):
+        self.closed = True
+
+
+def test_invalid_message_closes_connection(loop):
+    app = aiosip.Application(loop=loop)
+    protocol = TCP(app=app, loop=loop)
+    protocol.transport = Transport()
+
+    protocol.data_received(OPTIONS.replace(b'CSeq: 1 OPTIONS\r\n', b''))
+    assert protocol.transport.closed
+    assert app.inflight == 0
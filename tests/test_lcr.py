@@ -0,0 +1,47 @@
+import io
+
+import aiosip
+import pytest
+
+
+RATES = '''prefix,trunk,rate
+33,france,0.02
+331,paris,0.01
+331,backup,0.005
+0033,international,0.1
+1,us,0.01
+'''
+
+
+def test_longest_prefix():
+    table = aiosip.LCRTable.from_csv(io.StringIO(RATES))
+    assert len(table) == 5
+
+    assert table.lookup('33612345678') == [('france', 0.02)]
+    assert table.lookup('+33145678901') == [('backup', 0.005), ('paris', 0.01)]
+    assert table.route('33145678901;phone-context=example.com') == 'backup'
+    assert table.route('0033145678901') == 'international'
+    assert table.route('12125550100') == 'us'
+    assert table.lookup('44123') == []
+    assert table.route('alice') is None
+    assert table.route('') is None
+
+
+def test_invalid_prefix():
+    with pytest.raises(ValueError):
+        aiosip.LCRTable([('33a', 'france', 0.02)])
+    with pytest.raises(ValueError):
+        aiosip.LCRTable([('1' * 20, 'far', 0.02)])
+
+
+async def test_swap(loop, tmpdir):
+    path = tmpdir.join('rates.csv')
+    path.write('44,uk,0.03\n')
+
+    lcr = aiosip.LCR(aiosip.LCRTable.from_csv(io.StringIO(RATES)))
+    assert lcr.route('4420') is None
+
+    previous = await lcr.load(str(path), loop=loop)
+    assert previous.route('33') == 'france'
+    assert lcr.route('4420') == 'uk'
+    assert lcr.route('33') is None
@@ -0,0 +1,64 @@
+import aiosip
+
+
+def make_request(**kwargs):
+    return aiosip.Request(
+        method='REGISTER',
+        cseq=1,
+        from_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>;tag=a1b2c3'),
+        to_details=aiosip.Contact.from_header('<sip:666@127.0.0.1:6000>'),
+        contact_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>'),
+        **kwargs
+    )
+
+
+def test_encode_is_cached():
+    msg = make_request(payload='hello')
+    encoded = msg.encode()
+    assert msg.encode() is encoded
+    assert encoded.startswith(b'REGISTER sip:666@127.0.0.1:6000 SIP/2.0\r\n')
+    assert encoded.endswith(b'\r\n\r\nhello')
+
+
+def test_encode_invalidated_by_headers():
+    msg = make_request()
+    encoded = msg.encode()
+    msg.headers['Authorization'] = 'Digest username="pytest"'
+    assert msg.encode() is not encoded
+    assert b'Authorization: Digest username="pytest"\r\n' in msg.encode()
+
+
+def test_encode_invalidated_by_cseq_and_payload():
+    msg = make_request()
+    encoded = msg.encode()
+    msg.cseq += 1
+    assert b'CSeq: 2 REGISTER\r\n' in msg.encode()
+
+    msg.payload = 'hello'
+    assert msg.encode().endswith(b'\r\n\r\nhello')
+    assert msg.encode() is not encoded
+
+
+def test_encode_invalidated_by_details():
+    msg = make_request()
+    msg.encode()
+    msg.to_details['params']['tag'] = 'd4e5f6'
+    assert b'To: <sip:666@127.0.0.1:6000>;tag=d4e5f6\r\n' in msg.encode()
+
+    msg.from_details = aiosip.Contact.from_header('<sip:other@127.0.0.1:7000>;tag=a1b2c3')
+    assert b'From: <sip:other@127.0.0.1:7000>;tag=a1b2c3\r\n' in msg.encode()
+
+    msg.contact_details['uri']['port'] = 7001
+    assert b'Contact: <sip:pytest@127.0.0.1:7001>\r\n' in msg.encode()
+
+
+def test_encode_header_order():
+    msg = make_request(headers=aiosip.message.CIMultiDict([
+        ('Via', ['SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bK1', 'SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK2']),
+        ('User-Agent', 'pytest'),
+        ('Route', '<sip:proxy.example.com;lr>'),
+        ('Expires', '1800'),
+    ]))
+    headers = [line.split(':', 1)[0] for line in msg.encode().decode().split('\r\n')[1:] if line]
+    assert headers == ['Via', 'Via', 'Route', 'Max-Forwards', 'From', 'To', 'Call-ID', 'CSeq', 'Contact',
+                       'Content-Length', 'Expires', 'User-Agent']
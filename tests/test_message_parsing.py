@@ -0,0 +1,96 @@
+import aiosip
+import pytest
+
+
+REQUEST = (
+    b'SUBSCRIBE sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+    b'Via: SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234\r\n'
+    b'Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK1234abcdef\r\n'
+    b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+    b'To: <sip:666@127.0.0.1:6000>\r\n'
+    b'Call-ID: 5f4b3c2d-1e0f\r\n'
+    b'CSeq: 1 SUBSCRIBE\r\n'
+    b'Expires:1800\r\n'
+    b'Content-Length: 5\r\n'
+    b'\r\n'
+    b'hello'
+)
+
+RESPONSE = (
+    b'SIP/2.0 180 Ringing\r\n'
+    b'Via: SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234\r\n'
+    b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+    b'To: <sip:666@127.0.0.1:6000>;tag=d4e5f6\r\n'
+    b'Call-ID: 5f4b3c2d-1e0f\r\n'
+    b'CSeq: 1 INVITE\r\n'
+    b'Content-Length: 0\r\n'
+    b'\r\n'
+)
+
+
+def test_parse_request():
+    msg = aiosip.Message.from_raw(REQUEST)
+    assert isinstance(msg, aiosip.Request)
+    assert msg.method == 'SUBSCRIBE'
+    assert msg.cseq == 1
+    assert msg.headers['Call-ID'] == '5f4b3c2d-1e0f'
+    assert msg.headers['expires'] == '1800'
+    assert msg.headers['Via'] == ['SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234',
+                                  'SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK1234abcdef']
+    assert msg.from_details['params']['tag'] == 'a1b2c3'
+    assert msg.payload == 'hello'
+
+
+def test_parse_response():
+    msg = aiosip.Message.from_raw(memoryview(RESPONSE))
+    assert isinstance(msg, aiosip.Response)
+    assert msg.status_code == 180
+    assert msg.status_message == 'Ringing'
+    assert msg.method == 'INVITE'
+    assert msg.to_details['params']['tag'] == 'd4e5f6'
+    assert msg.payload == ''
+
+
+def test_parse_raw_headers_with_offset():
+    end = REQUEST.index(b'\r\n\r\n')
+    msg = aiosip.Message.from_raw_headers(REQUEST, end)
+    assert msg.headers['Content-Length'] == '5'
+
+
+@pytest.mark.parametrize('data', [
+    b'HELLO WORLD\r\n\r\n',
+    b'SIP/2.0 OK Ringing\r\n\r\n',
+    b'INVITE sip:666@127.0.0.1 HTTP/1.1\r\n\r\n',
+    b'INVITE sip:666@127.0.0.1 SIP/2.0',
+])
+def test_parse_invalid(data):
+    with pytest.raises(ValueError):
+        aiosip.Message.from_raw(data)
+
+
+def test_raw_headers_are_lazy():
+    def decoded(headers):
+        return [header[0] for header in headers._headers.values() if header[2] is not aiosip.headers._MISSING]
+
+    msg = aiosip.Message.from_raw(REQUEST)
+    assert decoded(msg.headers) == ['CSeq']
+
+    assert 'call-id' in msg.headers
+    assert decoded(msg.headers) == ['CSeq']
+    assert msg.headers['CALL-ID'] == '5f4b3c2d-1e0f'
+    assert decoded(msg.headers) == ['Call-ID', 'CSeq']
+
+
+def test_raw_headers_mapping():
+    msg = aiosip.Message.from_raw(REQUEST)
+    assert list(msg.headers) == ['Via', 'From', 'To', 'Call-ID', 'CSeq', 'Expires', 'Content-Length']
+    assert msg.headers.get('Subject') is None
+    assert msg.headers.getall('Expires') == ['1800']
+
+    msg.headers['expires'] = '0'
+    msg.headers.add('Route', '<sip:proxy.example.com;lr>')
+    del msg.headers['Content-Length']
+    assert dict(msg.headers)['Expires'] == '0'
+    assert msg.headers['route'] == '<sip:proxy.example.com;lr>'
+    assert 'Content-Length' not in msg.headers
+    assert len(msg.headers) == 7
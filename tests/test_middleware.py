@@ -0,0 +1,94 @@
+import asyncio
+
+import aiosip
+
+
+async def test_middleware_built_once(test_server, protocol, loop, from_details, to_details):
+    factories = []
+    calls = []
+
+    async def middleware_factory(handler):
+        factories.append(handler)
+
+        async def middleware(request, message):
+            calls.append(message.method)
+            return await handler(request, message)
+        return middleware
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+            return self.on_message
+
+        async def on_message(self, request, message):
+            assert isinstance(request, aiosip.RequestContext)
+            assert request.msg is message
+            await request.reply(200)
+
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan(), middleware=[middleware_factory])
+    server = await test_server(server_app)
+
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+
+    for _ in range(3):
+        response = await peer.send_request(
+            'MESSAGE',
+            from_details=aiosip.Contact.from_header(from_details),
+            to_details=aiosip.Contact.from_header(to_details),
+        )
+        assert response.status_code == 200
+
+    assert len(factories) == 1
+    assert calls == ['MESSAGE'] * 3
+
+    await app.close()
+    await server_app.close()
+
+
+async def test_concurrent_compilation(loop):
+    compiled = []
+    release = loop.create_future()
+
+    async def middleware_factory(handler):
+        compiled.append(handler)
+        await release
+        return handler
+
+    class Routes:
+        async def route(self, request, message):
+            pass
+
+    routes = Routes()
+    app = aiosip.Application(loop=loop, middleware=[middleware_factory])
+    tasks = [loop.create_task(app._compile_route(routes.route)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set_result(None)
+
+    assert await asyncio.gather(*tasks) == [routes.route] * 3
+    assert len(compiled) == 1
+
+
+async def test_compiled_routes_lru(loop, monkeypatch):
+    monkeypatch.setattr(aiosip.application, 'MAX_COMPILED_ROUTES', 2)
+
+    async def middleware_factory(handler):
+        return handler
+
+    def make_route():
+        async def route(request, message):
+            pass
+        return route
+
+    app = aiosip.Application(loop=loop, middleware=[middleware_factory])
+    first, second, third = make_route(), make_route(), make_route()
+    await app._compile_route(first)
+    await app._compile_route(second)
+    await app._compile_route(first)
+    await app._compile_route(third)
+
+    assert [entry[0] for entry in app._routes.values()] == [(first, ), (third, )]
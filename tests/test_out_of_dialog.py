@@ -0,0 +1,74 @@
+import aiosip
+
+
+async def test_message(test_server, protocol, loop, from_details, to_details):
+    received = loop.create_future()
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+
+            return self.on_message
+
+        async def on_message(self, request, message):
+            received.set_result(message)
+            await request.reply(202, headers={'X-Test': 'accepted'})
+
+    app = aiosip.Application(loop=loop)
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan())
+    server = await test_server(server_app)
+
+    peer = await app.connect(
+        protocol=protocol,
+        remote_addr=(server.sip_config['server_host'], server.sip_config['server_port'])
+    )
+
+    response = await peer.send_request(
+        'MESSAGE',
+        from_details=aiosip.Contact.from_header(from_details),
+        to_details=aiosip.Contact.from_header(to_details),
+        headers={'Content-Type': 'text/plain'},
+        payload='Hello',
+    )
+
+    assert response.status_code == 202
+    assert response.headers['X-Test'] == 'accepted'
+    assert response.to_details['params']['tag']
+    assert (await received).payload == 'Hello'
+
+    assert not app._dialogs
+    assert not server_app._dialogs
+
+    await app.close()
+    await server_app.close()
+
+
+class Peer:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg):
+        self.sent.append(msg)
+
+
+async def test_reply_keeps_to_tag(loop):
+    msg = aiosip.Message.from_raw(
+        b'INVITE sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+        b'Via: SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234\r\n'
+        b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+        b'To: <sip:666@127.0.0.1:6000>\r\n'
+        b'Call-ID: 5f4b3c2d-1e0f\r\n'
+        b'CSeq: 1 INVITE\r\n'
+        b'Content-Length: 0\r\n'
+        b'\r\n'
+    )
+    peer = Peer()
+    request = aiosip.RequestContext(aiosip.Application(loop=loop), peer, msg)
+
+    await request.reply(180)
+    await request.reply(200)
+
+    ringing, ok = (aiosip.Message.from_raw(response.encode()) for response in peer.sent)
+    assert ringing.to_details['params']['tag']
+    assert ringing.to_details['params']['tag'] == ok.to_details['params']['tag']
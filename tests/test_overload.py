@@ -0,0 +1,64 @@
+import asyncio
+
+import aiosip
+import pytest
+
+from aiosip.overload import OverloadController
+
+
+class App:
+    def __init__(self):
+        self._transactions = {}
+        self._server_transactions = {}
+
+
+async def test_loop_lag(loop):
+    controller = OverloadController(App(), max_lag=0.05, interval=0.01, loop=loop)
+    controller.start()
+    await asyncio.sleep(0.05)
+    assert not controller.overloaded
+
+    # A sample due half a second ago, as if a callback had blocked the loop
+    controller._due = loop.time() - 0.5
+    controller._sample()
+    assert controller.lag > 0.05
+    assert controller.overloaded
+    assert controller.reject() >= 10
+    assert controller.state()['rejected'] == 1
+
+    for _ in range(10):
+        controller._due = loop.time()
+        controller._sample()
+    assert not controller.overloaded
+    controller.stop()
+    assert controller._handle is None
+
+
+def test_transactions():
+    app = App()
+    controller = OverloadController(app, max_transactions=10)
+    app._transactions = dict.fromkeys(range(5))
+    app._server_transactions = dict.fromkeys(range(5))
+    assert not controller.overloaded
+    app._server_transactions = dict.fromkeys(range(25))
+    assert controller.overloaded
+    assert controller.state()['transactions'] == 30
+    assert controller.reject() == 15
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+async def test_overload_rejects_new_requests(test_server, udp_client, protocol, loop):
+    server_app = aiosip.Application(loop=loop, defaults={'overload_max_lag': 0.01})
+    server = await test_server(server_app)
+    server_app.overload.lag = 100
+
+    client = await udp_client(server)
+    client.send()
+
+    response = await client.receive()
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) > 5
+    assert server_app.overload.state()['rejected'] == 1
+    assert not server_app._server_transactions
+
+    await server_app.close()
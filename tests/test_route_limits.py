@@ -0,0 +1,76 @@
+import asyncio
+
+import aiosip
+import pytest
+
+
+class Dialplan(aiosip.BaseDialplan):
+
+    def __init__(self, release):
+        self.release = release
+
+    async def resolve(self, *args, **kwargs):
+        await super().resolve(*args, **kwargs)
+        return self.options
+
+    async def options(self, request, message):
+        await self.release
+        await request.reply(200)
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+async def test_route_task_limit(test_server, udp_client, protocol, loop):
+    release = loop.create_future()
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan(release), defaults={'max_route_tasks': 1})
+    server = await test_server(server_app)
+
+    client = await udp_client(server)
+    client.send()
+    client.send(call_id='second', branch='second')
+
+    response = await client.receive()
+    assert response.status_code == 503
+    assert response.headers['Call-ID'] == 'second'
+    assert server_app.tasks == 1
+
+    release.set_result(None)
+    response = await client.receive()
+    assert response.status_code == 200
+    await asyncio.sleep(0.01)
+    assert server_app.tasks == 0
+
+    await server_app.close()
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+async def test_limit_route(test_server, udp_client, protocol, loop):
+    release = loop.create_future()
+    dialplan = Dialplan(release)
+    server_app = aiosip.Application(loop=loop, dialplan=dialplan, defaults={'max_route_tasks': 1})
+    server_app.limit_route(dialplan.options, 2)
+    server = await test_server(server_app)
+
+    client = await udp_client(server)
+    client.send()
+    client.send(call_id='second', branch='second')
+    client.send(call_id='third', branch='third')
+
+    response = await client.receive()
+    assert response.status_code == 503
+    assert response.headers['Call-ID'] == 'third'
+    assert server_app.tasks == 2
+
+    # Without a cap, the route is no longer bound by max_route_tasks either
+    server_app.limit_route(dialplan.options, None)
+    client.send(call_id='fourth', branch='fourth')
+    await asyncio.sleep(0.05)
+    assert client.responses.empty()
+    assert server_app.tasks == 3
+
+    release.set_result(None)
+    responses = [await client.receive() for _ in range(3)]
+    assert {response.status_code for response in responses} == {200}
+    await asyncio.sleep(0.01)
+    assert server_app.tasks == 0
+
+    await server_app.close()
@@ -0,0 +1,48 @@
+import asyncio
+
+import aiosip
+import pytest
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+async def test_retransmitted_request(test_server, udp_client, protocol, loop):
+    calls = []
+    release = loop.create_future()
+
+    class Dialplan(aiosip.BaseDialplan):
+
+        async def resolve(self, *args, **kwargs):
+            await super().resolve(*args, **kwargs)
+
+            return self.on_options
+
+        async def on_options(self, request, message):
+            calls.append(message)
+            await release
+            await request.prepare(status_code=200)
+
+    server_app = aiosip.Application(loop=loop, dialplan=Dialplan())
+    server = await test_server(server_app)
+
+    client = await udp_client(server)
+    request = client.request()
+
+    # Retransmissions while the handler runs are discarded
+    client.send(request)
+    client.send(request)
+    await asyncio.sleep(0.1)
+    assert len(calls) == 1
+    assert client.responses.empty()
+
+    release.set_result(None)
+    response = await client.receive()
+    assert response.status_code == 200
+
+    # Once answered, the response is sent again without calling the handler
+    client.send(request)
+    retransmitted = await client.receive()
+    assert retransmitted.status_code == 200
+    assert retransmitted.headers['To'] == response.headers['To']
+    assert len(calls) == 1
+
+    await server_app.close()
@@ -0,0 +1,48 @@
+import aiosip
+import pytest
+
+
+def test_encode_stateless_response(raw_options):
+    request = aiosip.Message.from_raw(raw_options(7000))
+    response = aiosip.Message.from_raw(aiosip.encode_stateless_response(request, 200, headers={'Allow': 'OPTIONS'}))
+
+    assert response.status_code == 200
+    assert response.status_message == 'OK'
+    assert response.headers.getall('Via') == request.headers.getall('Via')
+    assert response.headers['From'] == request.headers['From']
+    assert response.to_details['params']['tag']
+    assert response.headers['Call-ID'] == request.headers['Call-ID']
+    assert response.cseq == 1
+    assert response.method == 'OPTIONS'
+    assert response.headers['Allow'] == 'OPTIONS'
+
+
+class Dialplan(aiosip.BaseDialplan):
+
+    async def resolve(self, *args, **kwargs):
+        await super().resolve(*args, **kwargs)
+
+        return aiosip.StatelessReply(200, headers={'Allow': 'OPTIONS'})
+
+
+@pytest.mark.parametrize('protocol', [aiosip.UDP])
+@pytest.mark.parametrize('options', [
+    {'defaults': {'stateless_options': True}},
+    {'dialplan': Dialplan()},
+])
+async def test_stateless_options(test_server, udp_client, protocol, loop, options):
+    server_app = aiosip.Application(loop=loop, **options)
+    server = await test_server(server_app)
+
+    client = await udp_client(server)
+    client.send()
+
+    response = await client.receive()
+    assert response.status_code == 200
+    assert len(response.headers.getall('Via')) == 2
+
+    assert not server_app._dialogs
+    assert not server_app._server_transactions
+    assert len(server_app._timers) == 0
+
+    await server_app.close()
@@ -0,0 +1,119 @@
+import asyncio
+import weakref
+
+from aiosip.timers import TimingWheel, ExpiryIndex
+
+
+async def test_timers_fire_in_order(loop):
+    wheel = TimingWheel(resolution=0.001, slots=4, levels=3, loop=loop)
+    fired = []
+    done = loop.create_future()
+
+    for delay in (0.03, 0.001, 0.012, 0.005):
+        wheel.schedule(delay, fired.append, delay)
+    wheel.schedule(0.04, done.set_result, None)
+    assert len(wheel) == 5
+
+    start = loop.time()
+    await asyncio.wait_for(done, timeout=1)
+    assert loop.time() - start >= 0.04
+    assert fired == [0.001, 0.005, 0.012, 0.03]
+    assert len(wheel) == 0
+    assert wheel._handle is None
+
+
+async def test_timer_beyond_span(loop):
+    # 4 ** 3 ticks of 1ms, the timer is parked and moved down until it expires
+    wheel = TimingWheel(resolution=0.001, slots=4, levels=3, loop=loop)
+    done = loop.create_future()
+
+    start = loop.time()
+    wheel.schedule(0.15, done.set_result, None)
+    await asyncio.wait_for(done, timeout=1)
+    assert loop.time() - start >= 0.15
+
+
+async def test_cancel_timer(loop):
+    wheel = TimingWheel(resolution=0.001, loop=loop)
+    fired = []
+
+    timer = wheel.schedule(0.005, fired.append, 'cancelled')
+    wheel.schedule(0.01, fired.append, 'fired')
+    timer.cancel()
+    assert timer.cancelled()
+    assert len(wheel) == 1
+
+    await asyncio.sleep(0.03)
+    assert fired == ['fired']
+
+
+async def test_callback_error(loop):
+    wheel = TimingWheel(resolution=0.001, loop=loop)
+    fired = []
+
+    wheel.schedule(0.002, fired.pop)
+    wheel.schedule(0.002, fired.append, 'fired')
+    await asyncio.sleep(0.02)
+    assert fired == ['fired']
+
+
+async def test_expiry_batches(loop):
+    batches = []
+    index = ExpiryIndex(batches.append, resolution=0.05, loop=loop)
+
+    for key in ('a', 'b', 'c'):
+        index.schedule(key, 0.01)
+    index.cancel('b')
+    assert len(index) == 2
+
+    await asyncio.sleep(0.1)
+    assert batches == [['a', 'c']]
+    assert len(index) == 0
+    assert index._handle is None
+
+
+async def test_expiry_moved(loop):
+    batches = []
+    index = ExpiryIndex(batches.append, resolution=0.01, loop=loop)
+
+    index.schedule('a', 0.02)
+    index.schedule('a', 0.06)
+    assert len(index._heap) == 1
+
+    await asyncio.sleep(0.04)
+    assert batches == []
+    assert index.deadline('a') is not None
+
+    # An earlier deadline is queued again, the later entry is then ignored
+    index.schedule('a', 0.5)
+    index.schedule('a', 0.01)
+    await asyncio.sleep(0.1)
+    assert batches == [['a']]
+    assert not index._queued
+
+    await asyncio.sleep(0.5)
+    assert batches == [['a']]
+    assert not index._heap
+
+
+async def test_expiry_cancel_releases_key(loop):
+    class Dialog:
+        pass
+
+    index = ExpiryIndex(lambda expired: None, loop=loop)
+    dialog = Dialog()
+    ref = weakref.ref(dialog)
+    index.schedule(dialog, 3600)
+    index.cancel(dialog)
+    del dialog
+
+    assert ref() is None
+    assert not index._queued and not index._keys
+
+    # Stale entries are dropped once they outnumber the live ones
+    for _ in range(200):
+        key = Dialog()
+        index.schedule(key, 3600)
+        index.cancel(key)
+    assert len(index._heap) <= 64
+    index.close()
@@ -0,0 +1,112 @@
+import asyncio
+
+import aiosip
+import pytest
+
+from aiosip.application import DEFAULTS
+from aiosip.peers import Peer
+from aiosip.timers import TimingWheel
+from aiosip.transaction import FutureTransaction
+
+
+class App:
+    def __init__(self, loop, **defaults):
+        self.defaults = {**DEFAULTS, **defaults}
+        self._timers = TimingWheel(loop=loop)
+        self._transactions = {}
+
+
+class Protocol:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg, addr):
+        self.sent.append(msg)
+
+
+class Dialog:
+    def __init__(self, protocol, loop):
+        self.app = App(loop)
+        self.peer = Peer(('127.0.0.1', 6000), self.app, loop=loop)
+        self.peer._protocol = type(protocol.__name__, (Protocol, ), {'reliable': protocol.reliable})()
+        self.ended = []
+
+    def _receive_response(self, msg):
+        self.app._transactions[msg.via.branch, msg.method]._incoming(msg)
+
+    def end_transaction(self, transaction):
+        self.ended.append(transaction)
+        transaction.close()
+
+
+def options():
+    return aiosip.Request(
+        method='OPTIONS',
+        cseq=1,
+        from_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>;tag=a1b2c3'),
+        to_details=aiosip.Contact.from_header('<sip:666@127.0.0.1:6000>'),
+        contact_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>'),
+    )
+
+
+@pytest.mark.parametrize('protocol, sent, ended', [
+    (aiosip.UDP, 2, False),  # Timer E, then Timer K
+    (aiosip.TCP, 1, True),
+])
+async def test_retransmissions(loop, protocol, sent, ended):
+    dialog = Dialog(protocol, loop)
+    msg = options()
+    transaction = FutureTransaction(dialog, original_msg=msg, loop=loop)
+
+    result = asyncio.ensure_future(transaction.start())
+    await asyncio.sleep(0.7)
+    assert len(dialog.peer._protocol.sent) == sent
+    assert transaction.timeout is not None
+
+    response = aiosip.Response.from_request(msg, 200, 'OK')
+    dialog._receive_response(response)
+    assert await result is response
+    assert bool(dialog.ended) is ended
+    assert bool(dialog.app._transactions) is not ended
+
+    transaction.close()
+    assert len(dialog.app._timers) == 0
+    assert not dialog.app._transactions
+
+
+def test_peer_t1(loop):
+    app = App(loop, t1_min=0.1, t1_max=2)
+    peer = Peer(('127.0.0.1', 6000), app, loop=loop)
+    assert peer.t1 == 0.5
+
+    peer._rtt_sample(0.01)
+    assert peer.srtt == 0.01
+    assert peer.t1 == 0.1
+
+    for _ in range(50):
+        peer._rtt_sample(0.6)
+    assert 0.55 < peer.srtt < 0.6
+    assert 0.6 < peer.t1 < 2
+
+    peer._rtt_sample(10)
+    assert peer.t1 == 2
+
+
+def test_peer_t1_override(loop):
+    app = App(loop, t1=0.1)
+    peer = Peer(('127.0.0.1', 6000), app, loop=loop)
+    assert peer.t1 == 0.1
+
+    # Same rack peer, the configured T1 is the floor
+    peer._rtt_sample(0.005)
+    assert peer.t1 == 0.1
+
+    for _ in range(50):
+        peer._rtt_sample(0.3)
+    assert 0.3 < peer.t1 < 4
+
+    # An explicit floor lets same rack peers adapt below the configured T1
+    app = App(loop, t1_min=0.01)
+    peer = Peer(('127.0.0.1', 6000), app, loop=loop)
+    peer._rtt_sample(0.002)
+    assert peer.t1 == 0.01
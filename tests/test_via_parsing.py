@@ -0,0 +1,98 @@
+import aiosip
+import pytest
+
+from aiosip.via import Via, ViaStack
+
+
+def test_simple_via():
+    via = Via.from_header('SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234')
+    assert via['protocol'] == 'UDP'
+    assert via['sentby'] == '127.0.0.1:7000'
+    assert via.host == '127.0.0.1'
+    assert via.port == 7000
+    assert via.branch == 'z9hG4bKabcdef1234'
+    assert via.rport is None
+    assert via.response_addr() == ('127.0.0.1', 7000)
+    assert str(via) == 'SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234'
+
+
+def test_via_received_and_rport():
+    # RFC 3581 - 4
+    via = Via.from_header('SIP/2.0/UDP 10.1.1.1:4540;received=192.0.2.1;rport=9988;branch=z9hG4bKkjshdyff')
+    assert via.received == '192.0.2.1'
+    assert via.rport == 9988
+    assert via.response_addr() == ('192.0.2.1', 9988)
+
+    via = Via.from_header('SIP/2.0/UDP 10.1.1.1:4540;rport;branch=z9hG4bKkjshdyff')
+    assert via.rport is True
+    assert via.response_addr() == ('10.1.1.1', 4540)
+    assert via.response_addr(source=('192.0.2.1', 9988)) == ('192.0.2.1', 9988)
+    assert str(via) == 'SIP/2.0/UDP 10.1.1.1:4540;rport;branch=z9hG4bKkjshdyff'
+
+
+def test_via_default_port():
+    assert Via.from_header('SIP/2.0/UDP pc33.atlanta.com;branch=z9hG4bK1').response_addr() == \
+        ('pc33.atlanta.com', 5060)
+    assert Via.from_header('SIP/2.0/TLS pc33.atlanta.com;branch=z9hG4bK1').response_addr() == \
+        ('pc33.atlanta.com', 5061)
+
+
+def test_via_stack():
+    stack = ViaStack([
+        'SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bK1, SIP/2.0/TCP 10.0.0.1:5060;branch=z9hG4bK2',
+        'SIP/2.0/UDP 10.0.0.2;branch=z9hG4bK3;received=192.0.2.1',
+    ])
+    assert stack.branch == 'z9hG4bK1'
+    assert stack.sentby == ('127.0.0.1', 7000)
+    assert stack._vias is None
+
+    assert len(stack) == 3
+    assert [via.branch for via in stack] == ['z9hG4bK1', 'z9hG4bK2', 'z9hG4bK3']
+    assert stack[1].protocol == 'TCP'
+    assert stack[2].received == '192.0.2.1'
+
+
+def test_message_via():
+    msg = aiosip.Message.from_raw(
+        b'OPTIONS sip:666@127.0.0.1:6000 SIP/2.0\r\n'
+        b'Via: SIP/2.0/UDP 127.0.0.1:7000;branch=z9hG4bKabcdef1234;rport\r\n'
+        b'Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK1234abcdef\r\n'
+        b'From: <sip:pytest@127.0.0.1:7000>;tag=a1b2c3\r\n'
+        b'To: <sip:666@127.0.0.1:6000>\r\n'
+        b'Call-ID: 5f4b3c2d-1e0f\r\n'
+        b'CSeq: 1 OPTIONS\r\n'
+        b'Content-Length: 0\r\n'
+        b'\r\n'
+    )
+    assert msg.via.branch == 'z9hG4bKabcdef1234'
+    assert msg.via.rport is True
+    assert len(msg.via) == 2
+
+
+def test_local_via_protocol():
+    msg = aiosip.Request(
+        method='OPTIONS',
+        cseq=1,
+        from_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>;tag=a1b2c3'),
+        to_details=aiosip.Contact.from_header('<sip:666@127.0.0.1:6000>'),
+        contact_details=aiosip.Contact.from_header('<sip:pytest@127.0.0.1:7000>'),
+    )
+    assert msg.via.top.protocol is None
+    assert msg.via.branch.startswith('z9hG4bK')
+
+    msg._set_via_protocol('TCP')
+    msg._set_via_protocol('UDP')
+    assert msg.via.top.protocol == 'TCP'
+    assert 'Via: SIP/2.0/TCP 127.0.0.1:7000;branch={}\r\n'.format(msg.via.branch) in str(msg)
+
+
+@pytest.mark.parametrize('header', [
+    '',
+    'SIP/2.0/UDP',
+    'SIP/2.0 127.0.0.1:7000',
+    'HTTP/1.1/TCP 127.0.0.1:7000',
+    'SIP/2.0/UDP 127.0.0.1:port',
+])
+def test_invalid_via(header):
+    with pytest.raises(ValueError):
+        Via.from_header(header)